@@ -0,0 +1,119 @@
+"""
+Startup benchmark for the msh entry point.
+
+Times fresh interpreter runs of the light CLI paths and checks that they do
+not import the heavy dependencies. Exits with 1 when a check fails or a
+median exceeds --max-ms, so CI can track it:
+
+    python benchmarks/startup.py --runs 20 --max-ms 150 --json startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = [
+    "rich",
+    "questionary",
+    "pydantic",
+    "yaml",
+    "chevron",
+    "RestrictedPython",
+]
+
+# Each case runs in a fresh interpreter, `main()` is called with the args
+CASES = {
+    "import": None,
+    "version": ["--version"],
+    "list": ["--list"],
+}
+
+
+def case_script(args) -> str:
+    script = "import sys\nimport msh.main\n"
+    if args is not None:
+        script += (
+            f"sys.argv = ['msh'] + {args!r}\n"
+            "sys.stdout = open(__import__('os').devnull, 'w')\n"
+            "msh.main.main()\n"
+        )
+    script += (
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "sys.stderr.write(','.join(loaded))\n"
+    )
+    return script
+
+
+def run_case(args, runs: int) -> dict:
+    script = case_script(args)
+    durations = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True
+        )
+        durations.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise SystemExit(f"Case {args!r} failed:\n{result.stderr}")
+        loaded = result.stderr.strip()
+    return {
+        "median_ms": round(statistics.median(durations), 2),
+        "min_ms": round(min(durations), 2),
+        "heavy_modules": [m for m in loaded.split(",") if m],
+    }
+
+
+def baseline(runs: int) -> float:
+    """Bare interpreter startup, to subtract from the case timings."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if a case median, minus bare interpreter startup, exceeds it.",
+    )
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args()
+
+    interpreter_ms = baseline(args.runs)
+    results = {"interpreter_ms": interpreter_ms, "cases": {}}
+    failed = False
+    print(f"{'interpreter':<10} {interpreter_ms:>8.1f} ms")
+    for name, case_args in CASES.items():
+        result = run_case(case_args, args.runs)
+        result["overhead_ms"] = round(result["median_ms"] - interpreter_ms, 2)
+        results["cases"][name] = result
+        status = "ok"
+        if result["heavy_modules"]:
+            status = f"imports {', '.join(result['heavy_modules'])}"
+            failed = True
+        elif args.max_ms is not None and result["overhead_ms"] > args.max_ms:
+            status = f"over {args.max_ms} ms"
+            failed = True
+        print(
+            f"{name:<10} {result['median_ms']:>8.1f} ms "
+            f"(+{result['overhead_ms']:.1f} ms)  {status}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
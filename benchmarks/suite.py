@@ -0,0 +1,337 @@
+"""
+Benchmark suite for meta loading, parameter resolution, convertors and
+rendering.
+
+Generates synthetic template trees in a temporary directory, times each
+stage of a render run on them and writes the results as JSON, so runs on
+two commits can be compared:
+
+    python benchmarks/suite.py --json before.json
+    python benchmarks/suite.py --json after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import yaml
+from rich.console import Console
+from rich.table import Table
+
+from msh import load_meta
+from msh.convertor_executor import exec_convertor
+from msh.InnerExecutor import call_inner_convertor
+from msh.load_meta import answer_from_values, resolve_metas, try_load_template_meta
+from msh.render import render_template
+from msh.template_index import load_template_index
+
+
+console = Console()
+
+CONVERTOR = """def convertor(params) -> str:
+    return params.get('name', '') + '-{index}'
+"""
+
+
+def ask(name: str) -> dict:
+    return {"name": name, "ask": True, "description": name}
+
+
+def write_template(
+    template_path: str, parameters: List[dict], files: Dict[str, str]
+) -> None:
+    os.makedirs(template_path)
+    with open(
+        os.path.join(template_path, "template_meta.yaml"), "w", encoding="utf-8"
+    ) as file:
+        yaml.safe_dump({"parameters": parameters}, file, sort_keys=False)
+    for relative_path, content in files.items():
+        file_path = os.path.join(template_path, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+
+def body(lines: int, names: List[str]) -> str:
+    return "".join(
+        f"line {i}: {{{{{names[i % len(names)]}}}}} static text to pad it out\n"
+        for i in range(lines)
+    )
+
+
+def many_small_files(template_path: str, scale: float) -> dict:
+    parameters = [ask("group"), ask("name")]
+    files = {
+        f"src/{{{{group}}}}/mod{i % 20}/file{i}.txt": body(40, ["group", "name"])
+        for i in range(int(1000 * scale))
+    }
+    write_template(template_path, parameters, files)
+    return {"group": "g", "name": "demo"}
+
+
+def few_huge_files(template_path: str, scale: float) -> dict:
+    parameters = [ask("group"), ask("name")]
+    lines = int(12000 * scale)
+    files = {f"data/huge{i}.sql": body(lines, ["group", "name"]) for i in range(2)}
+    write_template(template_path, parameters, files)
+    return {"group": "g", "name": "demo"}
+
+
+def deep_nesting(template_path: str, scale: float) -> dict:
+    parameters = [ask("group"), ask("name")]
+    directory = "/".join(
+        f"{{{{group}}}}{depth}" if depth % 3 == 0 else f"level{depth}"
+        for depth in range(30)
+    )
+    files = {
+        f"{directory}/branch{i % 10}/{{{{name}}}}{i}.txt": body(5, ["name"])
+        for i in range(int(200 * scale))
+    }
+    write_template(template_path, parameters, files)
+    return {"group": "g", "name": "demo"}
+
+
+def many_parameters(template_path: str, scale: float) -> dict:
+    count = int(200 * scale)
+    case_types = ["camel", "pascal", "snake", "const", "spinal", "title"]
+    parameters = [ask(f"p{i}") for i in range(count)]
+    parameters += [
+        {
+            "name": f"d{i}",
+            "target": f"p{i}",
+            "description": f"d{i}",
+            "innerConvertor": [
+                {
+                    "name": "change_case",
+                    "params": {"caseType": case_types[i % len(case_types)]},
+                },
+                {"name": "substr", "params": {"start": 0, "end": 12}},
+            ],
+        }
+        for i in range(count)
+    ]
+    names = [f"d{i}" for i in range(count)]
+    files = {f"src/file{i}.txt": body(count, names) for i in range(20)}
+    write_template(template_path, parameters, files)
+    return {f"p{i}": f"some value {i}" for i in range(count)}
+
+
+def heavy_convertors(template_path: str, scale: float) -> dict:
+    count = int(40 * scale)
+    parameters = [ask("name")]
+    parameters += [
+        {
+            "name": f"c{i}",
+            "description": f"c{i}",
+            "convertor": CONVERTOR.format(index=i),
+        }
+        for i in range(count)
+    ]
+    names = [f"c{i}" for i in range(count)]
+    files = {f"src/file{i}.txt": body(count, names) for i in range(20)}
+    write_template(template_path, parameters, files)
+    return {"name": "demo"}
+
+
+SCENARIOS: Dict[str, Callable[[str, float], dict]] = {
+    "many_small_files": many_small_files,
+    "few_huge_files": few_huge_files,
+    "deep_nesting": deep_nesting,
+    "many_parameters": many_parameters,
+    "heavy_convertors": heavy_convertors,
+}
+
+
+def time_stage(func: Callable[[int], object], repeat: int) -> dict:
+    """Run `func(run)` `repeat` times; the first run is cold, later ones warm."""
+    durations = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        func(run)
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        "cold_ms": round(durations[0], 3),
+        "median_ms": round(statistics.median(durations), 3),
+        "min_ms": round(min(durations), 3),
+    }
+
+
+def bench_scenario(
+    workdir: str, name: str, scale: float, repeat: int, concurrency: str
+) -> Dict[str, dict]:
+    template_path = os.path.join(workdir, "templates", name)
+    values = SCENARIOS[name](template_path, scale)
+    output_root = os.path.join(workdir, "output", name)
+
+    stages: Dict[str, dict] = {}
+    stages["load_meta"] = time_stage(
+        lambda run: try_load_template_meta(template_path), repeat
+    )
+    template_meta = try_load_template_meta(template_path)
+
+    stages["index"] = time_stage(lambda run: load_template_index(template_path), repeat)
+    index = load_template_index(template_path)
+
+    def resolve(run):
+        return resolve_metas(
+            template_meta, answer_from_values(values), index.references()
+        )
+
+    stages["resolve"] = time_stage(resolve, repeat)
+    metas = resolve(0)
+
+    stages["render"] = time_stage(
+        lambda run: render_template(
+            template_path,
+            os.path.join(output_root, str(run)),
+            metas,
+            concurrency=concurrency,
+            index=index,
+        ),
+        repeat,
+    )
+    shutil.rmtree(output_root, ignore_errors=True)
+    return stages
+
+
+def bench_calls(repeat: int, calls: int) -> Dict[str, dict]:
+    """Per-call latency of user convertors in the sandbox and inner convertors."""
+    params = {"name": "demo"}
+    convertor = CONVERTOR.format(index=0)
+    stages = {}
+    stages["convertor_call"] = time_stage(
+        lambda run: [exec_convertor(convertor, params) for _ in range(calls)],
+        repeat,
+    )
+    stages["inner_convertor_call"] = time_stage(
+        lambda run: [
+            call_inner_convertor(
+                "change_case", {"value": "hello big world", "caseType": "camel"}
+            )
+            for _ in range(calls)
+        ],
+        repeat,
+    )
+    for stage in stages.values():
+        stage["calls"] = calls
+    return stages
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_results(results: dict, baseline: dict = None, threshold: float = 10.0):
+    table = Table(title=f"msh benchmarks {results['commit']}")
+    table.add_column("scenario")
+    table.add_column("stage")
+    table.add_column("cold ms", justify="right")
+    table.add_column("median ms", justify="right")
+    if baseline is not None:
+        table.add_column(f"vs {baseline.get('commit', 'baseline')}", justify="right")
+
+    regressions = []
+    for scenario, stages in results["scenarios"].items():
+        for stage, timing in stages.items():
+            row = [
+                scenario,
+                stage,
+                f"{timing['cold_ms']:.1f}",
+                f"{timing['median_ms']:.1f}",
+            ]
+            if baseline is not None:
+                previous = baseline["scenarios"].get(scenario, {}).get(stage)
+                if previous and previous["median_ms"] > 0:
+                    change = (timing["median_ms"] / previous["median_ms"] - 1) * 100
+                    color = "red" if change > threshold else "green"
+                    row.append(f"[{color}]{change:+.1f}%[/{color}]")
+                    if change > threshold:
+                        regressions.append(f"{scenario}.{stage}")
+                else:
+                    row.append("-")
+            table.add_row(*row)
+    console.print(table)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Scenarios to run, all by default.",
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier for file counts."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per stage.")
+    parser.add_argument(
+        "--calls", type=int, default=200, help="Calls per convertor run."
+    )
+    parser.add_argument("--concurrency", default="serial")
+    parser.add_argument("--json", default="benchmark.json", help="Results file, JSON.")
+    parser.add_argument("--compare", help="Earlier results file to compare with.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Median slowdown, in percent, reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    # Keep the per-parameter progress lines out of the report
+    load_meta.console.quiet = True
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="msh-bench-")
+    try:
+        for name in args.scenario or SCENARIOS:
+            console.print(f"[cyan]Running [magenta]{name}[/magenta]...[/cyan]")
+            results["scenarios"][name] = bench_scenario(
+                workdir, name, args.scale, args.repeat, args.concurrency
+            )
+        results["scenarios"]["calls"] = bench_calls(args.repeat, args.calls)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.json, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    regressions = print_results(results, baseline, args.threshold)
+    console.print(f"Results written to [magenta]{args.json}[/magenta]")
+    if regressions:
+        console.print(f"[red]Regressions: {', '.join(regressions)}[/red]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import ast
 import inspect
 from typing import Callable
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel
 from RestrictedPython import compile_restricted, safe_builtins
 from RestrictedPython.Eval import default_guarded_getitem
 
@@ -19,7 +19,7 @@ class FunctionSignatureValidator(BaseModel):
         :param func_str: 包含函数定义的字符串
         :param expected_sig: 预期的函数签名
         :return: 验证通过的函数
-        :raises: ValidationError 如果验证失败
+        :raises: ValueError 如果验证失败
         """
         # 1. 解析函数定义
         func = cls._extract_function(func_str)
@@ -36,7 +36,7 @@ class FunctionSignatureValidator(BaseModel):
             # 解析AST
             module_ast = ast.parse(func_str)
         except SyntaxError as e:
-            raise ValidationError(f"语法错误: {e}")
+            raise ValueError(f"语法错误: {e}")
 
         # 查找函数定义
         function_defs = [
@@ -44,7 +44,7 @@ class FunctionSignatureValidator(BaseModel):
         ]
 
         if not function_defs:
-            raise ValidationError("未找到函数定义")
+            raise ValueError("未找到函数定义")
 
         # 使用第一个函数
         func_ast = function_defs[0]
@@ -65,17 +65,18 @@ class FunctionSignatureValidator(BaseModel):
             exec(code, restricted_globals)
             return restricted_globals[func_name]
         except Exception as e:
-            raise ValidationError(f"函数提取失败: {e}")
+            raise ValueError(f"函数提取失败: {e}")
 
     @classmethod
     def _validate_signature(cls, func: Callable, expected_sig: inspect.Signature):
         """验证函数签名"""
 
-        # 获取实际签名
-        actual_sig = inspect.signature(func)
+        # 获取实际签名，RestrictedPython 编译出的注解是字符串，需要求值后再比较
+        try:
+            actual_sig = inspect.signature(func, eval_str=True)
+        except Exception:
+            actual_sig = inspect.signature(func)
 
         # 比较实际签名和预期签名
         if actual_sig != expected_sig:
-            raise ValidationError(
-                f"函数签名不匹配: 预期 {expected_sig}, 实际 {actual_sig}"
-            )
+            raise ValueError(f"函数签名不匹配: 预期 {expected_sig}, 实际 {actual_sig}")
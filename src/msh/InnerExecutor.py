@@ -1,6 +1,7 @@
+from functools import partial
 from inspect import signature
-from typing import Any, Callable, Dict
-from .inner_convertor import inner_convertors
+from typing import Any, Callable, Dict, List
+from .inner_convertor import inner_convertors, inner_convertors_many
 
 
 def call_inner_convertor(
@@ -31,6 +32,44 @@ def validate_parameters(
             )
 
 
+def compile_inner_convertor(
+    name: str,
+    parameters: Dict[str, Any],
+) -> Callable[[str], str]:
+    """
+    编译内部转换器：预先查找函数、验证参数名称、类型和必填参数，
+    返回只接收 value 的函数，调用时不再重复查找和验证
+    :param name: 函数名称
+    :param parameters: 除 value 以外的参数
+    :return: 绑定了参数的函数
+    :raises ValueError: 如果函数不存在或参数不匹配
+    """
+    callable = get_callable(name)
+    try:
+        validate_parameters(callable, parameters)
+        signature(callable).bind("", **parameters)
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for inner convertor '{name}': {e}")
+    return partial(callable, **parameters)
+
+
+def compile_inner_convertor_many(
+    name: str,
+    parameters: Dict[str, Any],
+) -> Callable[[List[str]], List[str]]:
+    """
+    编译一次调用转换多个值的内部转换器，验证方式同 `compile_inner_convertor`
+    :param name: 函数名称
+    :param parameters: 除 value 以外的参数
+    :return: 接收多个值、按顺序返回结果的函数
+    :raises ValueError: 如果函数不存在或参数不匹配
+    """
+    convertor = compile_inner_convertor(name, parameters)
+    if name in inner_convertors_many:
+        return partial(inner_convertors_many[name], **parameters)
+    return lambda values: [convertor(value) for value in values]
+
+
 def get_callable(name: str) -> Callable[..., str]:
     """
     获取一个可以调用的函数
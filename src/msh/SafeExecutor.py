@@ -1,7 +1,13 @@
-from typing import Any, List, Callable
-from pydantic import validate_arguments
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Dict, List, Optional, Sequence
+import atexit
+import multiprocessing
+import queue
 import sys
+import threading
+import time
+
+from . import profiling
+from .msh_constants import SANDBOX_POOL_SIZE, SANDBOX_START_TIMEOUT
 
 try:
     import resource
@@ -11,10 +17,21 @@ except ImportError:
     HAS_RESOURCE = False
 
 
+def current_address_space() -> int:
+    """当前进程已占用的虚拟地址空间(字节)，无法获取时返回 0"""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError, NameError):
+        return 0
+
+
 def set_memory_limit(memory_limit):
     if HAS_RESOURCE and sys.platform != "win32":
         try:
-            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+            # 在沙箱进程已加载的基础上再允许 memory_limit 字节
+            limit = current_address_space() + memory_limit
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
         except Exception:
             # 可记录日志或忽略
             pass
@@ -23,42 +40,309 @@ def set_memory_limit(memory_limit):
         pass
 
 
+def _run_batch(func, params_list: List[List[Any]]) -> tuple:
+    """
+    依次执行每组参数，返回 (状态, 每项的 (状态, 结果))
+    内存耗尽后进程状态不可信，不再执行剩余的参数
+    """
+    results = []
+    for params in params_list:
+        try:
+            results.append(("ok", func(*params)))
+        except MemoryError:
+            results.append(("memory", None))
+            return "memory", results
+        except Exception as e:
+            results.append(("error", str(e)))
+    return "ok", results
+
+
+def _worker_main(conn, memory_limit: int):
+    """
+    沙箱进程主循环：接收 ("call", 函数源码, 参数列表) 或
+    ("batch", 函数源码, 多组参数列表)，返回执行结果
+    """
+    from .convertor_executor import get_convertor
+
+    set_memory_limit(memory_limit)
+    conn.send(("ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+
+        kind, func_str, params = message
+        start = time.perf_counter()
+        try:
+            func = get_convertor(func_str)
+            if kind == "batch":
+                status, result = _run_batch(func, params)
+            else:
+                status, result = "ok", func(*params)
+            conn.send((status, result, time.perf_counter() - start))
+        except MemoryError:
+            conn.send(("memory", None, time.perf_counter() - start))
+        except Exception as e:
+            conn.send(("error", str(e), time.perf_counter() - start))
+
+
+class SandboxWorker:
+    """一个常驻的沙箱进程，拥有独立的内存限制"""
+
+    def __init__(self, context, memory_limit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_limit), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(SANDBOX_START_TIMEOUT):
+            self.kill()
+            raise RuntimeError("沙箱进程启动超时")
+        self.conn.recv()
+
+    def call(self, message: Any, timeout: float) -> tuple:
+        """
+        :raises: TimeoutError 如果超时, EOFError 如果进程异常退出
+        """
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise TimeoutError()
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=1)
+        except (OSError, ValueError):
+            pass
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    常驻沙箱进程池
+
+    进程按需启动并在调用之间复用，超时、超出内存或崩溃的进程会被回收，
+    下次调用时重新启动。
+    """
+
+    def __init__(self, size: int, memory_limit: int):
+        self.size = size
+        self.memory_limit = memory_limit
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._workers: List[SandboxWorker] = []
+        self._starting = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> SandboxWorker:
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                start_new = len(self._workers) + self._starting < self.size
+                if start_new:
+                    self._starting += 1
+            if start_new:
+                break
+            # 等待空闲进程；被回收的进程会腾出名额，因此需要定期重新检查
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        try:
+            worker = SandboxWorker(self._context, self.memory_limit)
+        finally:
+            with self._lock:
+                self._starting -= 1
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: SandboxWorker):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    def run(self, func_str: str, params: List[Any], timeout: float) -> tuple:
+        """在沙箱进程中执行函数源码，返回 (状态, 结果, 沙箱内执行耗时)"""
+        return self._call(("call", func_str, params), timeout)
+
+    def run_batch(
+        self, func_str: str, params_list: List[List[Any]], timeout: float
+    ) -> tuple:
+        """
+        在同一个沙箱进程中依次执行多组参数，一次往返，超时作用于整批，
+        返回 (状态, 每项的 (状态, 结果), 沙箱内执行耗时)
+        """
+        return self._call(("batch", func_str, params_list), timeout)
+
+    def _call(self, message: tuple, timeout: float) -> tuple:
+        worker = self._acquire()
+        try:
+            result = worker.call(message, timeout)
+        except BaseException:
+            self._discard(worker)
+            raise
+        if result[0] == "memory":
+            # 内存耗尽后的进程状态不可信，直接回收
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+
+_pools: Dict[int, SandboxPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_sandbox_pool(memory_limit: int, size: Optional[int] = None) -> SandboxPool:
+    """获取指定内存限制的沙箱进程池，同一限制共用一个进程池"""
+    with _pools_lock:
+        pool = _pools.get(memory_limit)
+        if pool is None:
+            pool = SandboxPool(size or SANDBOX_POOL_SIZE, memory_limit)
+            _pools[memory_limit] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_sandbox_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
 class SafeExecutor:
     """安全的函数执行器"""
 
     @staticmethod
     def execute(
-        func: Callable,
+        func_str: str,
         params: List[Any] = [],
         timeout: float = 5.0,
         memory_limit: int = 50 * 1024 * 1024,  # 50MB
     ) -> str:
         """
-        安全执行函数
+        在常驻沙箱进程中安全执行函数
 
-        :param func: 要执行的函数
+        :param func_str: 包含函数定义的字符串
         :param params: 参数列表
         :param timeout: 执行超时(秒)
-        :param memory_limit: 内存限制(字节)
+        :param memory_limit: 内存限制(字节)，作用于沙箱进程，windows 下无效
         :return: 函数执行结果
         :raises: TimeoutError, MemoryError, RuntimeError
         """
+        pool = get_sandbox_pool(memory_limit)
+        start = time.perf_counter()
+        try:
+            status, result, elapsed = pool.run(func_str, list(params), timeout)
+        except TimeoutError as e:
+            raise TimeoutError(f"执行超时 ({timeout} 秒)") from e
+        except (EOFError, OSError) as e:
+            raise RuntimeError("执行错误: 沙箱进程异常退出") from e
+
+        # 往返耗时减去沙箱内执行耗时，即为进程间通信和调度的开销
+        duration = time.perf_counter() - start
+        profiling.record(
+            "sandbox",
+            "sandbox",
+            start,
+            duration,
+            execution=elapsed,
+            overhead=duration - elapsed,
+        )
+
+        if status == "memory":
+            raise MemoryError(f"超出内存限制 ({memory_limit} 字节)")
+        if status == "error":
+            raise RuntimeError(f"执行错误: {result}")
+        return result
+
+    @staticmethod
+    def execute_batch(
+        func_str: str,
+        params_list: Sequence[List[Any]],
+        timeout: float = 5.0,
+        memory_limit: int = 50 * 1024 * 1024,  # 50MB
+    ) -> List[Any]:
+        """
+        在常驻沙箱进程中对多组参数执行同一个函数，整批只需一次进程间往返
 
-        # 带资源限制的函数包装
-        @validate_arguments
-        def restricted_func(params: List[Any]) -> Any:
-            # 设置内存限制，windows 下无效
-            set_memory_limit(memory_limit)
-            return func(*params)
+        超时作用于整批；内存限制作用于执行整批的沙箱进程，某一项超出内存时
+        该项失败，剩余的参数在新的沙箱进程中继续执行，共用剩余的超时时间。
 
-        # 使用线程池设置超时
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(restricted_func, params)
+        :param func_str: 包含函数定义的字符串
+        :param params_list: 每一项为一次调用的参数列表
+        :param timeout: 整批执行超时(秒)
+        :param memory_limit: 内存限制(字节)，作用于沙箱进程，windows 下无效
+        :return: 与 params_list 一一对应的执行结果，执行失败的项为对应的异常
+            (MemoryError, RuntimeError)
+        :raises: TimeoutError 如果整批超时, RuntimeError 如果函数无法编译
+            或沙箱进程异常退出
+        """
+        pool = get_sandbox_pool(memory_limit)
+        results: List[Any] = []
+        deadline = time.perf_counter() + timeout
+        while len(results) < len(params_list):
+            pending = [list(params) for params in params_list[len(results) :]]
+            start = time.perf_counter()
+            remaining = deadline - start
+            if remaining <= 0:
+                raise TimeoutError(f"执行超时 ({timeout} 秒)")
             try:
-                return future.result(timeout=timeout)
+                status, items, elapsed = pool.run_batch(func_str, pending, remaining)
             except TimeoutError as e:
                 raise TimeoutError(f"执行超时 ({timeout} 秒)") from e
-            except MemoryError as e:
-                raise MemoryError(f"超出内存限制 ({memory_limit} 字节)") from e
-            except Exception as e:
-                raise RuntimeError(f"执行错误: {e}") from e
+            except (EOFError, OSError) as e:
+                raise RuntimeError("执行错误: 沙箱进程异常退出") from e
+
+            duration = time.perf_counter() - start
+            profiling.record(
+                "sandbox",
+                "sandbox",
+                start,
+                duration,
+                execution=elapsed,
+                overhead=duration - elapsed,
+                items=len(pending),
+            )
+
+            if status == "error":
+                raise RuntimeError(f"执行错误: {items}")
+            if items is None:
+                # 执行之外的内存耗尽，无法确定是哪一项
+                raise MemoryError(f"超出内存限制 ({memory_limit} 字节)")
+            for item_status, result in items:
+                if item_status == "memory":
+                    results.append(MemoryError(f"超出内存限制 ({memory_limit} 字节)"))
+                elif item_status == "error":
+                    results.append(RuntimeError(f"执行错误: {result}"))
+                else:
+                    results.append(result)
+        return results
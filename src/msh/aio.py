@@ -0,0 +1,247 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from .load_meta import answer_from_values, answer_parameters, resolve_meta
+from .meta_graph import MetaGraph
+from .types import Parameter
+from .msh_constants import ASYNC_RENDER_WORKERS, DEFAULT_TEMPLATES_PATH
+from .render import (
+    RenderError,
+    render_bytes,
+    render_output_file,
+    render_path,
+    walk_files,
+)
+from .partials import load_partials
+from .server import LoadedTemplate, RequestError, TemplateStore
+from .sinks import FileSystemSink
+
+
+class AsyncRenderer:
+    """
+    Renders templates from asyncio code without blocking the event loop.
+
+        async with AsyncRenderer() as renderer:
+            files = await renderer.render("demo", {"group": "group1"})
+
+    Convertor calls, file reads and writes run on one shared pool of
+    `max_workers` threads, at most `max_workers` of them at a time across
+    all concurrent renders of an event loop; a renderer may be used from
+    several loops. Loaded templates are kept like `msh serve` does,
+    compiled templates and convertors are in their process-wide caches.
+
+    Cancelling a render stops scheduling its remaining jobs, waits for the
+    running ones and leaves the output directory untouched.
+    """
+
+    def __init__(
+        self,
+        templates_path: str = DEFAULT_TEMPLATES_PATH,
+        max_workers: int = ASYNC_RENDER_WORKERS,
+    ):
+        self.store = TemplateStore(templates_path)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="msh-aio"
+        )
+        self._max_workers = max_workers
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    async def __aenter__(self) -> "AsyncRenderer":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # A semaphore binds to the first loop waiting on it, keep one per loop
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self._max_workers)
+        return semaphore
+
+    async def _call(self, func: Callable[..., Any], *args) -> Any:
+        async with self._semaphore():
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # A running job cannot be interrupted, let it finish before
+                # its output is cleaned up
+                await asyncio.wait([future])
+                raise
+
+    async def templates(self) -> List[str]:
+        return await self._call(self.store.names)
+
+    async def render(
+        self,
+        template: str,
+        params: Dict[str, Any],
+        output: Optional[str] = None,
+        fsync: str = "none",
+    ) -> Union[Dict[str, bytes], List[str]]:
+        """
+        Resolve the parameters of `template` from `params` and render it.
+
+        :return: without `output`, the rendered content keyed by output path
+            relative to the template root; otherwise the written file paths
+        :raises RequestError: if the template or the parameters are invalid
+        :raises RenderError: if any file failed to render
+        """
+        loaded: LoadedTemplate = await self._call(self.store.get, template)
+        metas = await self.resolve(loaded, params)
+        if output is None:
+            return await self.render_to_memory(loaded, metas)
+        return await self.render_template(loaded, output, metas, fsync)
+
+    async def resolve(self, loaded: LoadedTemplate, params: Dict[str, Any]) -> dict:
+        """
+        Evaluate the parameters like `resolve_metas`, level by level, each
+        parameter on the pool: the independent convertors of a level run
+        concurrently, bounded by `max_workers` like any other job.
+        """
+        graph = loaded.meta.graph
+        answers, needed = await self._call(answer_params, loaded, params)
+        metas: Dict[str, str] = {}
+        for level in graph.levels(needed):
+            level_params = [graph.parameters[name] for name in level]
+            results = await asyncio.gather(
+                *(
+                    self._call(resolve_param, param, answers, metas, graph)
+                    for param in level_params
+                )
+            )
+            for param, meta in zip(level_params, results):
+                if meta is not None:
+                    metas[param.name] = meta
+        return metas
+
+    async def render_to_memory(
+        self, loaded: LoadedTemplate, metas: dict
+    ) -> Dict[str, bytes]:
+        file_paths: List[str] = await self._call(walk_files, loaded.path)
+        partials = await self._call(load_partials, loaded.path)
+        relative_paths = [
+            Path(os.path.relpath(render_path(file_path, metas), loaded.path)).as_posix()
+            for file_path in file_paths
+        ]
+        contents = await self.run_jobs(
+            render_bytes,
+            [
+                (
+                    file_path,
+                    metas,
+                    loaded.index.has_tags(loaded.path, file_path),
+                    partials,
+                )
+                for file_path in file_paths
+            ],
+        )
+        return dict(zip(relative_paths, contents))
+
+    async def render_template(
+        self, loaded: LoadedTemplate, output_path: str, metas: dict, fsync: str
+    ) -> List[str]:
+        """Like `render_template`, through a `FileSystemSink`."""
+        file_paths: List[str] = await self._call(walk_files, loaded.path)
+        partials = await self._call(load_partials, loaded.path)
+        sink = FileSystemSink(output_path, fsync)
+        await self._call(sink.__enter__)
+        try:
+            output_file_paths = []
+            jobs = []
+            for file_path in file_paths:
+                rendered_path = render_path(file_path, metas)
+                output_file_path = rendered_path.replace(loaded.path, output_path)
+                output_file_paths.append(output_file_path)
+                jobs.append(
+                    (
+                        file_path,
+                        sink.staged(output_file_path),
+                        metas,
+                        None,
+                        loaded.index.has_tags(loaded.path, file_path),
+                        loaded.index.can_stream(loaded.path, file_path),
+                        fsync == "per-file",
+                        partials,
+                    )
+                )
+            await self._call(
+                sink.make_directories,
+                [os.path.dirname(path) for path in output_file_paths],
+            )
+            await self.run_jobs(render_output_file, jobs)
+        except BaseException:
+            await asyncio.shield(self._call(sink.abort))
+            raise
+        await self._call(sink.close)
+        return output_file_paths
+
+    async def run_jobs(self, func: Callable[..., Any], jobs: List[tuple]) -> List[Any]:
+        """
+        Run `func(*job)` for every job on the pool, like `run_jobs`: results
+        in job order, failures raised together as `RenderError`.
+        """
+        results = await asyncio.gather(
+            *(self._call(func, *job) for job in jobs), return_exceptions=True
+        )
+        errors: List[Tuple[str, Exception]] = [
+            (job[0], result)
+            for job, result in zip(jobs, results)
+            if isinstance(result, Exception)
+        ]
+        if errors:
+            raise RenderError(errors) from errors[0][1]
+        return results
+
+
+def answer_params(
+    loaded: LoadedTemplate, params: Dict[str, Any]
+) -> Tuple[Dict[str, Optional[str]], Optional[Set[str]]]:
+    try:
+        return answer_parameters(
+            loaded.meta, answer_from_values(params), loaded.index.references()
+        )
+    except SystemExit:
+        raise RequestError(400, "Invalid parameters, see the server log.")
+
+
+def resolve_param(
+    param: Parameter,
+    answers: Dict[str, Optional[str]],
+    metas: Dict[str, str],
+    graph: MetaGraph,
+) -> Optional[str]:
+    try:
+        return resolve_meta(param, answers, metas, graph)
+    except SystemExit:
+        raise RequestError(400, "Invalid parameters, see the server log.")
+
+
+_renderers: Dict[str, AsyncRenderer] = {}
+
+
+async def render(
+    template: str,
+    params: Dict[str, Any],
+    output: Optional[str] = None,
+    templates_path: str = DEFAULT_TEMPLATES_PATH,
+) -> Union[Dict[str, bytes], List[str]]:
+    """
+    Render with a renderer shared by every call for the same templates
+    directory, see `AsyncRenderer.render`.
+    """
+    renderer = _renderers.get(templates_path)
+    if renderer is None:
+        renderer = _renderers[templates_path] = AsyncRenderer(templates_path)
+    return await renderer.render(template, params, output)
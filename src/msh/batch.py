@@ -0,0 +1,276 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+import yaml
+from pydantic import ValidationError
+from rich.console import Console
+
+from .types import BatchEntry, BatchManifest, TemplateMeta
+from .load_meta import resolve_metas_batch, answer_from_values
+from .registry import TemplateRegistry
+from .render import (
+    RenderError,
+    load_template_files,
+    render_path,
+    render_template,
+    render_to_sink,
+)
+from .sinks import OutputSink
+from .render_cache import RenderCache
+from .template_cache import template_cache, token_names
+from .template_index import TemplateIndex, load_template_index
+from .incremental import render_template_incremental
+from .plan import RenderPlan, plan_render
+from .msh_constants import DEFAULT_TEMPLATES_PATH
+
+
+console = Console()
+
+
+def load_manifest(manifest_path: str) -> BatchManifest:
+    """
+    Load a batch manifest.
+    `.jsonl` files hold one parameter set per line, anything else is read as
+    YAML holding either a list of parameter sets or a `template`/`sets` mapping.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            if manifest_path.endswith(".jsonl"):
+                sets = [BatchEntry(**json.loads(line)) for line in file if line.strip()]
+                return BatchManifest(sets=sets)
+
+            data = yaml.safe_load(file) or []
+            if isinstance(data, list):
+                return BatchManifest(sets=[BatchEntry(**entry) for entry in data])
+            return BatchManifest(**data)
+    except FileNotFoundError:
+        console.print(
+            f"[red]Manifest file not found: [cyan]{manifest_path}[/cyan][/red]"
+        )
+        raise SystemExit()
+    except (json.JSONDecodeError, yaml.YAMLError, TypeError) as e:
+        console.print(
+            f"[red]Invalid manifest ([cyan]{manifest_path}[/cyan]): {e}[/red]"
+        )
+        raise SystemExit()
+    except ValidationError as e:
+        errors = e.errors()
+        console.print(
+            f"[red]Validation error in manifest ([cyan]{manifest_path}[/cyan]): [/red]"
+        )
+        console.print(
+            f"[red]Location[/red]: {'.'.join(str(x) for x in errors[0]['loc'])}"
+        )
+        console.print(f"[red]Error: {errors[0]['msg']}[/red]")
+        raise SystemExit()
+
+
+def check_output_names(output_names: Dict[int, str], output_root: str) -> List[int]:
+    """
+    Report the sets whose output would escape `output_root` or is shared
+    with another set, which would silently overwrite it.
+
+    :return: the offending set indexes
+    """
+    root = os.path.realpath(output_root)
+    invalid: List[int] = []
+    sets_by_path: Dict[str, List[int]] = {}
+    for index, output_name in output_names.items():
+        output_path = os.path.realpath(os.path.join(root, output_name))
+        if output_path == root or os.path.commonpath([root, output_path]) != root:
+            console.print(
+                f"[red]Set #{index}: output '{output_name}' is not a directory under the output root.[/red]"
+            )
+            invalid.append(index)
+        else:
+            sets_by_path.setdefault(output_path, []).append(index)
+    for output_path, indexes in sets_by_path.items():
+        if len(indexes) > 1:
+            console.print(
+                f"[red]Sets {', '.join(f'#{i}' for i in indexes)}: output '{os.path.relpath(output_path, root)}' is used by more than one set.[/red]"
+            )
+            invalid.extend(indexes)
+    return invalid
+
+
+def run_batch(
+    manifest_path: str,
+    output_root: str,
+    default_template: Optional[str] = None,
+    concurrency: str = "serial",
+    max_workers: Optional[int] = None,
+    incremental: bool = False,
+    fsync: str = "none",
+    sink: Optional[OutputSink] = None,
+    cache: Optional[RenderCache] = None,
+    plan: Optional[Callable[[RenderPlan], None]] = None,
+    diff: bool = False,
+) -> List[str]:
+    """
+    Render every parameter set of the manifest into its own directory under
+    `output_root`. Template meta and template files are loaded once per
+    template and shared by all the sets using it, and the metas of all the
+    sets of a template are resolved together, see `resolve_metas_batch`.
+    With `incremental`, each set only rewrites the files whose inputs changed
+    since the last run.
+    With a `sink`, the sets are written into it under their output names
+    instead, and `output_root` is not used. Without `incremental`, files
+    rendered before are taken from the `cache` if given.
+    With `plan`, nothing is written: each set is planned with `plan_render`
+    (comparing contents with `diff`) and its plan passed to `plan`.
+    Sets whose output name escapes `output_root` or is shared with another
+    set fail before anything is rendered, see `check_output_names`.
+
+    :return: output directories of the sets rendered successfully
+    """
+    manifest = load_manifest(manifest_path)
+    registry = TemplateRegistry()
+    loaded: Dict[str, Tuple[TemplateMeta, Dict[str, Optional[str]], TemplateIndex]] = {}
+    rendered: List[str] = []
+    failures: List[int] = []
+
+    # Sets are resolved per template, together, so that each convertor runs
+    # once per dependency level for all the sets in one sandbox round trip
+    pending: Dict[str, Dict[int, BatchEntry]] = {}
+    for index, entry in enumerate(manifest.sets, start=1):
+        template_name = entry.template or manifest.template or default_template
+        if template_name is None:
+            console.print(
+                f"[red]Set #{index}: no template given, use `--template` or the `template` field.[/red]"
+            )
+            failures.append(index)
+            continue
+
+        template_path = f"{DEFAULT_TEMPLATES_PATH}/{template_name}"
+        try:
+            if template_name not in loaded:
+                template = registry.get(template_name)
+                template_index = load_template_index(
+                    template_path, file_paths=template.files
+                )
+                loaded[template_name] = (
+                    template.meta,
+                    load_template_files(template_path, template_index, template.files),
+                    template_index,
+                )
+        except SystemExit:
+            console.print(f"[red]Set #{index}: skipped.[/red]")
+            failures.append(index)
+            continue
+        pending.setdefault(template_name, {})[index] = entry
+
+    resolved: Dict[int, Tuple[str, Dict[str, str]]] = {}
+    for template_name, entries in pending.items():
+        template_meta, _, template_index = loaded[template_name]
+        referenced = template_index.references()
+        # Output names may use derived parameters the files do not
+        for entry in entries.values():
+            if referenced is not None and entry.output:
+                names = token_names(template_cache.compile(entry.output))
+                referenced = None if names is None else referenced | names
+        results = resolve_metas_batch(
+            template_meta,
+            {
+                f"Set #{index}": answer_from_values(entry.params)
+                for index, entry in entries.items()
+            },
+            referenced,
+        )
+        for index, metas in zip(entries, results.values()):
+            if metas is None:
+                failures.append(index)
+            else:
+                resolved[index] = (template_name, metas)
+
+    # Check every output before rendering any, so no set overwrites another
+    output_names: Dict[int, str] = {}
+    for index, entry in enumerate(manifest.sets, start=1):
+        if index in resolved:
+            template_name, metas = resolved[index]
+            output_names[index] = (
+                render_path(entry.output, metas)
+                if entry.output
+                else f"{template_name}_{index:04d}"
+            )
+    for index in check_output_names(output_names, output_root):
+        del resolved[index]
+        failures.append(index)
+
+    for index, entry in enumerate(manifest.sets, start=1):
+        if index not in resolved:
+            continue
+        template_name, metas = resolved[index]
+        template_path = f"{DEFAULT_TEMPLATES_PATH}/{template_name}"
+        _, files, template_index = loaded[template_name]
+
+        output_name = output_names[index]
+        output_path = os.path.join(output_root, output_name)
+        try:
+            if plan is not None:
+                console.print(
+                    f"[cyan]Set #{index}: planning render to: [magenta]{output_path}[/magenta][/cyan]"
+                )
+                plan(
+                    plan_render(
+                        template_path,
+                        output_path,
+                        metas,
+                        files=files,
+                        index=template_index,
+                        diff=diff,
+                    )
+                )
+                rendered.append(output_path)
+                continue
+            if sink is not None:
+                output_path = output_name
+                render_to_sink(
+                    template_path,
+                    metas,
+                    sink,
+                    files=files,
+                    index=template_index,
+                    prefix=output_name,
+                )
+                console.print(
+                    f"[green]√[/green] Set #{index} rendered to: [magenta]{output_path}[/magenta]"
+                )
+                rendered.append(output_path)
+                continue
+            options = dict(
+                template_path=template_path,
+                output_path=output_path,
+                metas=metas,
+                files=files,
+                concurrency=concurrency,
+                max_workers=max_workers,
+                fsync=fsync,
+                index=template_index,
+            )
+            if incremental:
+                result = render_template_incremental(**options)
+            else:
+                result = render_template(**options, cache=cache)
+        except RenderError as e:
+            for file_path, file_error in e.errors:
+                console.print(
+                    f"[red]Set #{index}: [cyan]{file_path}[/cyan]: {file_error}[/red]"
+                )
+            failures.append(index)
+            continue
+        summary = ""
+        if incremental:
+            summary = f" ({len(result.rendered)} written, {len(result.unchanged) + len(result.skipped)} unchanged)"
+        console.print(
+            f"[green]√[/green] Set #{index} rendered to: [magenta]{output_path}[/magenta]{summary}"
+        )
+        rendered.append(output_path)
+
+    if failures:
+        failures.sort()
+        console.print(
+            f"\n[red]{len(failures)} of {len(manifest.sets)} sets failed: {', '.join(f'#{i}' for i in failures)}[/red]"
+        )
+        raise SystemExit(1)
+
+    return rendered
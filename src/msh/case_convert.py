@@ -0,0 +1,123 @@
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .msh_constants import CASE_CACHE_SIZE
+
+
+@lru_cache(maxsize=CASE_CACHE_SIZE)
+def split_words(value: str) -> Tuple[str, ...]:
+    """
+    把标识符拆分为单词，结果按 LRU 缓存，同一个值转换为多种格式时只拆分一次
+
+    - 非字母数字字符（空格、`-`、`_`、`.` 等）作为分隔符
+    - 小写字母或数字后的大写字母开始新单词：`fooBar` -> `foo`, `Bar`
+    - 连续大写字母中，后面跟小写字母的最后一个大写字母开始新单词：
+      `HTTPServer` -> `HTTP`, `Server`
+    - 数字归属于前面的单词：`utf8Name` -> `utf8`, `Name`
+
+    :param value: 要拆分的字符串
+    :return: 单词列表，保留原始大小写
+    """
+    words: List[str] = []
+    start = -1
+    length = len(value)
+    for i, char in enumerate(value):
+        if not char.isalnum():
+            if start >= 0:
+                words.append(value[start:i])
+                start = -1
+            continue
+        if start < 0:
+            start = i
+            continue
+        if char.isupper():
+            previous = value[i - 1]
+            if not previous.isupper() or (i + 1 < length and value[i + 1].islower()):
+                words.append(value[start:i])
+                start = i
+    if start >= 0:
+        words.append(value[start:])
+    return tuple(words)
+
+
+def capitalize(word: str) -> str:
+    return word[:1].upper() + word[1:].lower()
+
+
+def camel(words: Tuple[str, ...]) -> str:
+    if not words:
+        return ""
+    return words[0].lower() + "".join(capitalize(word) for word in words[1:])
+
+
+def pascal(words: Tuple[str, ...]) -> str:
+    return "".join(capitalize(word) for word in words)
+
+
+def joined(separator: str, transform: Callable[[str], str]):
+    def convert(words: Tuple[str, ...]) -> str:
+        return separator.join(transform(word) for word in words)
+
+    return convert
+
+
+def sentence(words: Tuple[str, ...]) -> str:
+    if not words:
+        return ""
+    return " ".join([capitalize(words[0])] + [word.lower() for word in words[1:]])
+
+
+# 基于单词的格式，共用 split_words 的缓存结果
+WORD_CASES: Dict[str, Callable[[Tuple[str, ...]], str]] = {
+    "camel": camel,
+    "const": joined("_", str.upper),
+    "pascal": pascal,
+    "path": joined("/", str.lower),
+    "sentence": sentence,
+    "snake": joined("_", str.lower),
+    "spinal": joined("-", str.lower),
+    "title": joined(" ", capitalize),
+}
+
+# 直接作用于整个字符串的格式
+STRING_CASES: Dict[str, Callable[[str], str]] = {
+    "capital": lambda value: value[:1].upper() + value[1:],
+    "lower": str.lower,
+    "trim": str.strip,
+    "upper": str.upper,
+    "alphanum": lambda value: "".join(char for char in value if char.isalnum()),
+}
+
+
+def convert_case(value: str, caseType: str) -> str:
+    """
+    改变字符串的格式
+    :param value: 要转换的字符串
+    :param caseType: 目标格式类型
+    :return: 转换后的字符串
+    :raises ValueError: 如果 caseType 不在已知类型中
+    """
+    word_case = WORD_CASES.get(caseType)
+    if word_case is not None:
+        return word_case(split_words(value))
+    string_case = STRING_CASES.get(caseType)
+    if string_case is not None:
+        return string_case(value)
+    raise ValueError(f"change_case unknown caseType: {caseType}")
+
+
+def convert_case_many(values: Iterable[str], caseType: str) -> List[str]:
+    """
+    把多个值转换为同一种格式
+    :param values: 要转换的字符串
+    :param caseType: 目标格式类型
+    :return: 按顺序排列的转换结果
+    :raises ValueError: 如果 caseType 不在已知类型中
+    """
+    word_case = WORD_CASES.get(caseType)
+    if word_case is not None:
+        return [word_case(split_words(value)) for value in values]
+    string_case = STRING_CASES.get(caseType)
+    if string_case is not None:
+        return [string_case(value) for value in values]
+    raise ValueError(f"change_case unknown caseType: {caseType}")
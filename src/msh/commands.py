@@ -0,0 +1,394 @@
+import argparse
+import sys
+from pathlib import Path
+from contextlib import contextmanager, redirect_stdout
+from typing import Optional
+from rich.console import Console
+from rich.table import Table
+import time
+from .render import RenderError, render_template, render_to_sink
+from .sinks import OutputSink, open_sink, parse_sink
+from .render_cache import RenderCache
+from .template_index import lint_template, load_template_index
+from .load_meta import ask_metas
+from .registry import TemplateRegistry
+from .batch import run_batch
+from .profiling import Profiler
+from .plan import RenderPlan, plan_render
+from .incremental import IncrementalResult, render_template_incremental
+from .msh_constants import (
+    DEFAULT_TEMPLATES_PATH,
+    DEFAULT_OUTPUT_PATH,
+    OUTPUT_TIMESTAMP_FORMAT,
+)
+
+console = Console()
+
+
+def get_output_path(template_name) -> str:
+    timestamp = time.strftime(OUTPUT_TIMESTAMP_FORMAT, time.localtime())
+    return f"{DEFAULT_OUTPUT_PATH}/{template_name}_{timestamp}"
+
+
+def choose_template(registry: TemplateRegistry) -> dict:
+    import questionary
+
+    templates = registry.names()
+    if len(templates) == 1:
+        console.print(
+            f"Only one template found: [magenta]{templates[0]}[/magenta]. Using it by default."
+        )
+        return {
+            "name": templates[0],
+            "path": f"{DEFAULT_TEMPLATES_PATH}/{templates[0]}",
+        }
+    choose_template = questionary.select(
+        "Which one template do you want to use?",
+        choices=templates,
+    ).ask()
+
+    if choose_template is None:
+        console.print("[red]Operation cancelled by user.[/red]")
+        raise SystemExit()
+
+    console.print(f"You have chosen template: [magenta]{choose_template}[/magenta].")
+    return {
+        "name": choose_template,
+        "path": f"{DEFAULT_TEMPLATES_PATH}/{choose_template}",
+    }
+
+
+def render_options(args: argparse.Namespace) -> dict:
+    return {
+        "concurrency": args.concurrency,
+        "max_workers": args.jobs,
+        "fsync": args.fsync,
+    }
+
+
+def render(args: argparse.Namespace, cache: Optional[RenderCache] = None, **kwargs):
+    """Render a template, incrementally if requested."""
+    if args.incremental:
+        result = render_template_incremental(**kwargs, **render_options(args))
+        print_incremental_result(result)
+    else:
+        render_template(**kwargs, **render_options(args), cache=cache)
+
+
+@contextmanager
+def render_cache(args: argparse.Namespace):
+    """
+    Open the --cache of the command, None without one. At the end of the run
+    the cache is trimmed to --cache-size and its statistics are printed.
+    """
+    if args.cache is None:
+        yield None
+        return
+    if args.incremental or args.sink is not None:
+        console.print("[red]--cache cannot be used with --incremental or --sink.[/red]")
+        raise SystemExit(1)
+    cache = RenderCache(
+        args.cache, max_size=args.cache_size * 1024 * 1024, link=args.cache_link
+    )
+    try:
+        yield cache
+    finally:
+        cache.prune()
+        print_cache_stats(cache)
+
+
+@contextmanager
+def output_sink(args: argparse.Namespace):
+    """
+    Open the --sink of the command, None without one. While the sink writes
+    to stdout, everything printed goes to stderr.
+    """
+    if args.sink is None:
+        yield None
+        return
+    if args.incremental or args.dry_run:
+        console.print(
+            "[red]--sink cannot be used with --incremental or --dry-run.[/red]"
+        )
+        raise SystemExit(1)
+    try:
+        _, path = parse_sink(args.sink)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise SystemExit(1)
+    with open_sink(args.sink) as sink:
+        if path == "-":
+            with redirect_stdout(sys.stderr):
+                yield sink
+        else:
+            yield sink
+
+
+def print_cache_stats(cache: RenderCache):
+    stats = cache.stats
+    console.print(
+        f"Render cache: [green]{stats.hits}[/green] hits, "
+        f"[yellow]{stats.misses}[/yellow] misses ({stats.hit_rate:.0%} hit rate), "
+        f"{stats.evicted} evicted."
+    )
+
+
+def print_incremental_result(result: IncrementalResult):
+    console.print(
+        f"[green]{len(result.rendered)}[/green] files written, "
+        f"[yellow]{len(result.unchanged)}[/yellow] rendered but unchanged, "
+        f"[cyan]{len(result.skipped)}[/cyan] up to date."
+    )
+
+
+@contextmanager
+def profiled(args: argparse.Namespace):
+    """Collect the timings of the enclosed run for --timings and --profile."""
+    if not args.timings and not args.profile:
+        yield
+        return
+    with Profiler() as profiler:
+        try:
+            yield
+        finally:
+            if args.timings:
+                print_timings(profiler)
+            if args.profile:
+                profiler.export(args.profile, args.profile_format)
+                console.print(
+                    f"[cyan]Profile written to: [magenta]{args.profile}[/magenta][/cyan]"
+                )
+
+
+def print_timings(profiler: Profiler):
+    summary = profiler.summary()
+
+    stages = Table(title="Stages")
+    stages.add_column("Stage")
+    stages.add_column("Time (ms)", justify="right")
+    for name, duration in summary["stages"].items():
+        stages.add_row(name, f"{duration * 1000:.1f}")
+    console.print(stages)
+
+    if summary["convertors"]:
+        convertors = Table(title="Convertors")
+        convertors.add_column("Parameter")
+        for column in ["Calls", "Total (ms)", "Mean (ms)", "Max (ms)"]:
+            convertors.add_column(column, justify="right")
+        for name, stats in summary["convertors"].items():
+            convertors.add_row(
+                name,
+                str(stats["calls"]),
+                f"{stats['total'] * 1000:.1f}",
+                f"{stats['mean'] * 1000:.1f}",
+                f"{stats['max'] * 1000:.1f}",
+            )
+        console.print(convertors)
+        sandbox = summary["sandbox"]
+        console.print(
+            f"Sandbox: {sandbox['calls']} calls, {sandbox['total'] * 1000:.1f} ms, "
+            f"of which {sandbox['overhead'] * 1000:.1f} ms outside the convertors"
+        )
+
+    files = summary["files"]
+    if files["slowest"]:
+        slowest = Table(title="Slowest files")
+        slowest.add_column("File")
+        for column in ["Time (ms)", "Read (bytes)", "Written (bytes)"]:
+            slowest.add_column(column, justify="right")
+        for file in files["slowest"]:
+            slowest.add_row(
+                file["path"],
+                f"{file['duration'] * 1000:.1f}",
+                str(file.get("bytes_read", "")),
+                str(file.get("bytes_written", "")),
+            )
+        console.print(slowest)
+    console.print(
+        f"Files: {files['count']} in {files['total'] * 1000:.1f} ms, "
+        f"{files['bytes_read']} bytes read, {files['bytes_written']} bytes written"
+    )
+
+
+def print_plan(plan: RenderPlan):
+    styles = {"create": "green", "overwrite": "yellow", "unchanged": "dim"}
+    table = Table(title="Render plan")
+    table.add_column("Action")
+    table.add_column("Output")
+    table.add_column("Size (bytes)", justify="right")
+    for file in plan.files:
+        style = styles[file.action]
+        size = "" if file.size is None else str(file.size)
+        if file.new_size is not None:
+            size = f"{size} -> {file.new_size}" if size else str(file.new_size)
+        table.add_row(f"[{style}]{file.action}[/{style}]", file.output, size)
+    console.print(table)
+
+    for file in plan.files:
+        if not file.diff:
+            continue
+        for line in file.diff.splitlines():
+            style = None
+            if line.startswith("+") and not line.startswith("+++"):
+                style = "green"
+            elif line.startswith("-") and not line.startswith("---"):
+                style = "red"
+            elif line.startswith("@@"):
+                style = "cyan"
+            console.print(line, style=style, markup=False, highlight=False)
+
+    console.print(
+        f"[green]{plan.count('create')}[/green] files to create, "
+        f"[yellow]{plan.count('overwrite')}[/yellow] to overwrite, "
+        f"[dim]{plan.count('unchanged')}[/dim] unchanged. Nothing was written."
+    )
+
+
+def print_render_error(error: RenderError):
+    console.print(
+        f"[red]Render Error: {len(error.errors)} files failed to render.[/red]"
+    )
+    for file_path, file_error in error.errors:
+        console.print(f"[red]  [cyan]{file_path}[/cyan]: {file_error}[/red]")
+
+
+def batch(
+    args: argparse.Namespace,
+    sink: Optional[OutputSink] = None,
+    cache: Optional[RenderCache] = None,
+):
+    default_template = args.template
+    if default_template is None:
+        templates = TemplateRegistry().names()
+        if len(templates) == 1:
+            default_template = templates[0]
+    output_root = args.sink or args.output or get_output_path("batch")
+    console.print(
+        f"[cyan]{'Planning' if args.dry_run else 'Rendering'} batch [magenta]{args.manifest}[/magenta] to path: [magenta]{output_root}[/magenta][/cyan]"
+    )
+    rendered = run_batch(
+        args.manifest,
+        output_root,
+        default_template,
+        incremental=args.incremental,
+        sink=sink,
+        cache=cache,
+        plan=print_plan if args.dry_run else None,
+        diff=args.diff,
+        **render_options(args),
+    )
+    if args.dry_run:
+        console.print(
+            f"\n[green]√：{len(rendered)} sets planned, nothing was written.[/green]"
+        )
+        return
+    console.print(
+        f"\n[green]√：{len(rendered)} sets rendered successfully to: [magenta]{output_root}[/magenta][/green]"
+    )
+
+
+def lint():
+    registry = TemplateRegistry()
+    entry = registry.get(choose_template(registry)["name"])
+    index = load_template_index(entry.path, file_paths=entry.files)
+    report = lint_template(entry.meta, index)
+    variable_files = index.variable_files()
+
+    for name in report["unused"]:
+        console.print(
+            f"[yellow]Unused parameter '{name}': not referenced by any file or parameter.[/yellow]"
+        )
+    for name in report["undefined"]:
+        console.print(
+            f"[red]Undefined variable '{name}' referenced in: {', '.join(variable_files[name])}[/red]"
+        )
+    if index.references() is None:
+        console.print(
+            "[yellow]The template uses partials, unused parameters cannot be detected.[/yellow]"
+        )
+    if not report["unused"] and not report["undefined"]:
+        console.print("[green]√：No issues found.[/green]")
+    if report["undefined"]:
+        raise SystemExit(1)
+
+
+def watch(args: argparse.Namespace):
+    from .watch import watch as watch_template
+
+    registry = TemplateRegistry()
+    if args.template is not None:
+        if args.template not in registry.names():
+            console.print(f"[red]Template '{args.template}' not found.[/red]")
+            raise SystemExit(1)
+        template_name = args.template
+    else:
+        template_name = choose_template(registry)["name"]
+    output_path = args.output or get_output_path(template_name)
+    watch_template(f"{DEFAULT_TEMPLATES_PATH}/{template_name}", output_path, args.poll)
+
+
+def interactive(
+    args: argparse.Namespace,
+    sink: Optional[OutputSink] = None,
+    cache: Optional[RenderCache] = None,
+):
+    if args.incremental and not args.output:
+        console.print("[red]--incremental needs a fixed --output directory.[/red]")
+        raise SystemExit(1)
+    console.print("[cyan]1. Choose template:[/cyan]")
+    registry = TemplateRegistry()
+    template_info = choose_template(registry)
+    entry = registry.get(template_info["name"])
+    console.print("\n[cyan]2. Ask metas for template:[/cyan]")
+    index = load_template_index(entry.path, file_paths=entry.files)
+    metas = ask_metas(entry.meta, index.references())
+    output_path = args.output or get_output_path(template_info["name"])
+    if args.dry_run:
+        console.print(
+            f"\n[cyan]3. Planning render to path: [magenta]{output_path}[/magenta][/cyan]"
+        )
+        plan = plan_render(
+            entry.path,
+            output_path,
+            metas,
+            files=dict.fromkeys(entry.files),
+            index=index,
+            diff=args.diff,
+        )
+        print_plan(plan)
+        return
+    if sink is not None:
+        console.print(
+            f"\n[cyan]3. Rendering template to: [magenta]{args.sink}[/magenta][/cyan]"
+        )
+        try:
+            render_to_sink(
+                entry.path, metas, sink, files=dict.fromkeys(entry.files), index=index
+            )
+        except RenderError as e:
+            print_render_error(e)
+            raise SystemExit(1)
+        console.print(
+            f"\n[green]√：Template rendered successfully to: [magenta]{args.sink}[/magenta][/green]"
+        )
+        return
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    console.print(
+        f"\n[cyan]3. Rendering template to path: [magenta]{output_path}[/magenta][/cyan]"
+    )
+    try:
+        render(
+            args,
+            cache,
+            template_path=template_info["path"],
+            output_path=output_path,
+            metas=metas,
+            files=dict.fromkeys(entry.files),
+            index=index,
+        )
+    except RenderError as e:
+        print_render_error(e)
+        raise SystemExit(1)
+    console.print(
+        f"\n[green]√：Template rendered successfully to: [magenta]{output_path}[/magenta][/green]"
+    )
@@ -1,7 +1,87 @@
-from typing import Dict
-from .FunctionSignatureValidator import FunctionSignatureValidator
-from .SafeExecutor import SafeExecutor
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
+from .msh_constants import CONVERTOR_CACHE_SIZE
+from .types import TemplateMeta
+import hashlib
 import inspect
+import threading
+
+
+CONVERTOR_EXPECTED_SIG = inspect.Signature(
+    parameters=[
+        inspect.Parameter("params", inspect.Parameter.POSITIONAL_OR_KEYWORD),
+    ],
+    return_annotation=str,
+)
+
+# 已验证并编译的转换器，键为源码哈希，按 LRU 淘汰
+_convertor_cache: "OrderedDict[str, Callable]" = OrderedDict()
+_convertor_cache_lock = threading.Lock()
+
+
+def convertor_key(func_str: str) -> str:
+    return hashlib.sha256(func_str.encode("utf-8")).hexdigest()
+
+
+def get_convertor(func_str: str) -> Callable:
+    """
+    获取已验证的转换器函数，同一源码只解析、编译和验证签名一次
+
+    :param func_str: 包含函数定义的字符串
+    :return: 验证通过的函数
+    :raises: ValueError 如果语法或签名验证失败
+    """
+    key = convertor_key(func_str)
+    with _convertor_cache_lock:
+        func = _convertor_cache.get(key)
+        if func is not None:
+            _convertor_cache.move_to_end(key)
+            return func
+
+    # RestrictedPython 只在模板确实有转换器时才导入
+    from .FunctionSignatureValidator import FunctionSignatureValidator
+
+    func = FunctionSignatureValidator.validate_function_signature(
+        func_str, CONVERTOR_EXPECTED_SIG
+    )
+
+    with _convertor_cache_lock:
+        _convertor_cache[key] = func
+        while len(_convertor_cache) > CONVERTOR_CACHE_SIZE:
+            _convertor_cache.popitem(last=False)
+    return func
+
+
+def invalidate_convertor_cache(func_str: Optional[str] = None):
+    """
+    使当前进程的转换器缓存失效
+
+    不会清除沙箱进程中的缓存：沙箱进程按源码哈希缓存，源码修改后自然使用新的键。
+
+    :param func_str: 要移除的转换器源码，为 None 时清空整个缓存
+    """
+    with _convertor_cache_lock:
+        if func_str is None:
+            _convertor_cache.clear()
+        else:
+            _convertor_cache.pop(convertor_key(func_str), None)
+
+
+def prewarm_convertors(template_meta: TemplateMeta) -> Dict[str, Exception]:
+    """
+    预先编译模板中的所有转换器
+
+    :param template_meta: 模板配置
+    :return: 验证失败的参数名称及其错误
+    """
+    errors: Dict[str, Exception] = {}
+    for param in template_meta.parameters:
+        if param.convertor:
+            try:
+                get_convertor(param.convertor)
+            except Exception as e:
+                errors[param.name] = e
+    return errors
 
 
 def exec_convertor(
@@ -16,22 +96,46 @@ def exec_convertor(
     :return: 函数执行结果
     """
 
-    # 1. 安全地从字符串中提取函数
-    convertor_expected_sig = inspect.Signature(
-        parameters=[
-            inspect.Parameter("params", inspect.Parameter.POSITIONAL_OR_KEYWORD),
-        ],
-        return_annotation=str,
-    )
-    func = FunctionSignatureValidator.validate_function_signature(
-        func_str, convertor_expected_sig
-    )
+    # 1. 在当前进程中提前验证并编译，暴露语法和签名错误（沙箱进程从源码编译）
+    get_convertor(func_str)
 
     # 2. 执行函数
-    result = SafeExecutor.execute(func, [params])
+    from .SafeExecutor import SafeExecutor
+
+    result = SafeExecutor.execute(func_str, [params])
 
     # 3. 渲染结果如果是空字符串，则返回 None
     if result == "":
         return None
 
     return result
+
+
+def exec_convertor_batch(
+    func_str: str,
+    params_list: List[Dict[str, str]],
+) -> List[Union[Optional[str], Exception]]:
+    """
+    对多组参数执行同一个字符串处理函数，整批在一次沙箱往返中完成
+
+    转换器仍然每次只接收一组参数，与 exec_convertor 的约定相同。
+
+    :param func_str: 包含函数定义的字符串
+    :param params_list: 每次调用的参数
+    :return: 与 params_list 一一对应的执行结果，空字符串为 None，执行失败的项为对应的异常
+    :raises: ValueError 如果语法或签名验证失败, TimeoutError 如果整批超时,
+        RuntimeError 如果沙箱进程异常退出
+    """
+    if not params_list:
+        return []
+
+    # 1. 提前暴露语法和签名错误
+    get_convertor(func_str)
+
+    # 2. 整批执行
+    from .SafeExecutor import SafeExecutor
+
+    results = SafeExecutor.execute_batch(func_str, [[params] for params in params_list])
+
+    # 3. 渲染结果如果是空字符串，则返回 None
+    return [None if result == "" else result for result in results]
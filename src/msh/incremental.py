@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from . import profiling
+from .msh_constants import INCREMENTAL_MANIFEST_FILE, STREAM_CHUNK_SIZE
+from .render import render_path, rendered_bytes, run_jobs, walk_files
+from .partials import Partials, load_partials, partials_digest
+from .writer import FILE_MODE, fsync_path
+from .template_index import TemplateIndex, load_template_index
+
+
+class IncrementalResult(BaseModel):
+    """Output files of an incremental render, relative to the output path."""
+
+    rendered: List[str] = Field(default_factory=list)
+    unchanged: List[str] = Field(default_factory=list)
+    skipped: List[str] = Field(default_factory=list)
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def metas_hash(metas: dict, names: Optional[set]) -> str:
+    """Hash of the metas a file references, or of all metas if unknown."""
+    if names is None:
+        referenced = metas
+    else:
+        referenced = {name: metas.get(name) for name in names}
+    return hash_bytes(json.dumps(referenced, sort_keys=True).encode("utf-8"))
+
+
+def load_manifest(output_path: str) -> Dict[str, dict]:
+    try:
+        with open(
+            os.path.join(output_path, INCREMENTAL_MANIFEST_FILE), "r", encoding="utf-8"
+        ) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_path: str, manifest: Dict[str, dict]):
+    with open(
+        os.path.join(output_path, INCREMENTAL_MANIFEST_FILE), "w", encoding="utf-8"
+    ) as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def output_is_current(output_file_path: str, entry: dict) -> bool:
+    """Whether the output file still holds what the manifest recorded."""
+    try:
+        stat = os.stat(output_file_path)
+    except FileNotFoundError:
+        return False
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime"]:
+        return True
+    return hash_template(output_file_path, None, False) == entry["output"]
+
+
+def hash_template(file_path: str, content: Optional[str], has_tags: bool) -> str:
+    """
+    Hash of a template file, read in chunks: the bytes of files copied as
+    they are, the text (as rendered, with universal newlines) of the others.
+    """
+    if content is not None:
+        return hash_bytes(content.encode("utf-8"))
+    digest = hashlib.sha256()
+    if has_tags:
+        with open(file_path, "r", encoding="utf-8") as file:
+            while chunk := file.read(STREAM_CHUNK_SIZE):
+                digest.update(chunk.encode("utf-8"))
+    else:
+        with open(file_path, "rb") as file:
+            while chunk := file.read(STREAM_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_sibling_temp(output_file_path: str, mode: int):
+    """A new temporary file next to `output_file_path`, to move over it."""
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(output_file_path)}.msh-",
+        dir=os.path.dirname(output_file_path) or ".",
+    )
+    # mkstemp creates it private, give it the mode the output would have
+    os.chmod(temp_path, mode)
+    os.close(fd)
+    return open(temp_path, "wb")
+
+
+def copy_prefix(source, target, size: int):
+    """Copy the first `size` bytes of `source` into `target`."""
+    source.seek(0)
+    while size > 0:
+        data = source.read(min(size, STREAM_CHUNK_SIZE))
+        if not data:
+            break
+        target.write(data)
+        size -= len(data)
+
+
+def write_if_changed(
+    chunks: Iterable[bytes], output_file_path: str
+) -> Tuple[bool, int, str]:
+    """
+    Compare rendered chunks with the file on disk as they come, so neither
+    the output nor the file is held in memory and an unchanged file is not
+    written. From the first chunk that differs, the output goes to a sibling
+    temporary file holding the matching prefix, moved over the file with
+    `os.replace` once every chunk rendered: a render failing halfway leaves
+    the old file as it was, like `OutputWriter`.
+
+    :return: whether the file was written, its size and its sha256
+    """
+    digest = hashlib.sha256()
+    size = 0
+    temp = None
+    try:
+        current = open(output_file_path, "rb")
+        mode = os.fstat(current.fileno()).st_mode & 0o777
+    except FileNotFoundError:
+        current = None
+        mode = FILE_MODE
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            if temp is None and (current is None or current.read(len(chunk)) != chunk):
+                temp = open_sibling_temp(output_file_path, mode)
+                if current is not None:
+                    copy_prefix(current, temp, size)
+            if temp is not None:
+                temp.write(chunk)
+            size += len(chunk)
+        if temp is None and (current is None or current.read(1)):
+            # A new empty file, or the file on disk is longer
+            temp = open_sibling_temp(output_file_path, mode)
+            if current is not None:
+                copy_prefix(current, temp, size)
+        if temp is None:
+            return False, size, digest.hexdigest()
+        temp.close()
+        os.replace(temp.name, output_file_path)
+        return True, size, digest.hexdigest()
+    except BaseException:
+        if temp is not None:
+            temp.close()
+            os.remove(temp.name)
+        raise
+    finally:
+        if current is not None:
+            current.close()
+
+
+def render_incremental_file(
+    file_path: str,
+    output_file_path: str,
+    metas: dict,
+    content: Optional[str],
+    has_tags: bool,
+    names: Optional[set],
+    previous: Optional[dict],
+    fsync: bool = False,
+    partials: Optional[Partials] = None,
+    partials_hash: str = "",
+    stream: bool = False,
+) -> dict:
+    """
+    Render one template file unless its template and referenced metas are
+    unchanged since the last run, and write it only if the rendered bytes
+    differ from the file on disk. Files without tags are copied as they are.
+    `names` are the metas the file references, None when unknown; such a
+    file may include partials, so `partials_hash` counts as its template.
+    Hashing, rendering and comparing go chunk by chunk, large files with
+    `stream` are rendered with bounded memory.
+
+    :return: the new manifest entry, with a `status` of `skipped`,
+        `unchanged` or `rendered`
+    """
+    template_hash = hash_template(file_path, content, has_tags)
+    if names is None:
+        template_hash = hash_bytes(f"{template_hash}{partials_hash}".encode("utf-8"))
+    entry = {
+        "source": file_path,
+        "template": template_hash,
+        "metas": metas_hash(metas, names),
+    }
+
+    if (
+        previous is not None
+        and previous.get("template") == entry["template"]
+        and previous.get("metas") == entry["metas"]
+        and output_is_current(output_file_path, previous)
+    ):
+        return {**previous, **entry, "status": "skipped"}
+
+    with profiling.span(file_path, "file") as args:
+        written, size, entry["output"] = write_if_changed(
+            rendered_bytes(file_path, metas, content, has_tags, stream, partials),
+            output_file_path,
+        )
+        status = "rendered" if written else "unchanged"
+        if written:
+            if not has_tags:
+                shutil.copymode(file_path, output_file_path)
+            if fsync:
+                fsync_path(output_file_path)
+        if args is not None:
+            args["bytes_read"] = os.path.getsize(file_path)
+            args["bytes_written"] = size if written else 0
+
+    stat = os.stat(output_file_path)
+    return {**entry, "size": stat.st_size, "mtime": stat.st_mtime_ns, "status": status}
+
+
+def render_template_incremental(
+    template_path: str,
+    output_path: str,
+    metas: dict,
+    files: Optional[Dict[str, Optional[str]]] = None,
+    concurrency: str = "serial",
+    max_workers: Optional[int] = None,
+    index: Optional[TemplateIndex] = None,
+    fsync: str = "none",
+) -> IncrementalResult:
+    """
+    Render templates into a fixed output directory, keeping a manifest of
+    (template hash, referenced metas hash, output hash) per output file so
+    the next run only re-renders and rewrites what changed.
+    Which metas each file references comes from the template variable `index`.
+    Output files that are no longer produced are left in place.
+    Files are rewritten in place; `fsync` is `none`, `per-file` or `at-end`
+    (the files written are synced before the manifest is saved).
+
+    :raises RenderError: if any file failed to render
+    """
+    previous_manifest = load_manifest(output_path)
+    if index is None:
+        index = load_template_index(template_path)
+
+    partials = load_partials(template_path)
+    partials_hash = partials_digest(partials)
+    jobs = []
+    for file_path in files if files is not None else walk_files(template_path):
+        rendered_path = render_path(file_path, metas)
+        rendered_output_path = rendered_path.replace(template_path, output_path)
+        relative_path = Path(os.path.relpath(rendered_output_path, output_path))
+        content = files[file_path] if files is not None else None
+        jobs.append(
+            (
+                file_path,
+                rendered_output_path,
+                metas,
+                content,
+                index.has_tags(template_path, file_path),
+                index.file_variables(template_path, file_path),
+                previous_manifest.get(relative_path.as_posix()),
+                fsync == "per-file",
+                partials,
+                partials_hash,
+                index.can_stream(template_path, file_path),
+            )
+        )
+
+    with profiling.span("mkdir"):
+        for directory in sorted({os.path.dirname(job[1]) for job in jobs}):
+            Path(directory).mkdir(parents=True, exist_ok=True)
+
+    with profiling.span("render", files=len(jobs)):
+        entries = run_jobs(render_incremental_file, jobs, concurrency, max_workers)
+
+    result = IncrementalResult()
+    manifest: Dict[str, dict] = {}
+    for job, entry in zip(jobs, entries):
+        relative_path = Path(os.path.relpath(job[1], output_path)).as_posix()
+        getattr(result, entry.pop("status")).append(relative_path)
+        manifest[relative_path] = entry
+    if fsync == "at-end":
+        for relative_path in result.rendered:
+            fsync_path(os.path.join(output_path, relative_path))
+    save_manifest(output_path, manifest)
+    return result
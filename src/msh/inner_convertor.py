@@ -1,5 +1,6 @@
-from typing import Callable, Dict
-import stringcase
+from typing import Callable, Dict, List
+
+from .case_convert import convert_case, convert_case_many
 
 
 def change_case(value: str, caseType: str) -> str:
@@ -10,35 +11,18 @@ def change_case(value: str, caseType: str) -> str:
     :return: 转换后的字符串
     :raises ValueError: 如果 caseType 不在已知类型中
     """
-    match caseType:
-        case "camel":
-            return stringcase.camelcase(value)
-        case "capital":
-            return stringcase.capitalcase(value)
-        case "const":
-            return stringcase.constcase(value)
-        case "lower":
-            return stringcase.lowercase(value)
-        case "pascal":
-            return stringcase.pascalcase(value)
-        case "path":
-            return stringcase.pathcase(value)
-        case "sentence":
-            return stringcase.sentencecase(value)
-        case "snake":
-            return stringcase.snakecase(value)
-        case "spinal":
-            return stringcase.spinalcase(value)
-        case "title":
-            return stringcase.titlecase(value)
-        case "trim":
-            return stringcase.trimcase(value)
-        case "upper":
-            return stringcase.uppercase(value)
-        case "alphanum":
-            return stringcase.alphanumcase(value)
-        case _:
-            raise ValueError(f"change_case unknown caseType: {caseType}")
+    return convert_case(value, caseType)
+
+
+def change_case_many(values: List[str], caseType: str) -> List[str]:
+    """
+    把多个值改变为同一种格式
+    :param values: 要转换的字符串
+    :param caseType: 目标格式类型
+    :return: 按顺序排列的转换结果
+    :raises ValueError: 如果 caseType 不在已知类型中
+    """
+    return convert_case_many(values, caseType)
 
 
 def substr(value: str, start: int = None, end: int = None) -> str:
@@ -56,3 +40,8 @@ inner_convertors: Dict[str, Callable[..., str]] = {
     "change_case": change_case,
     "substr": substr,
 }
+
+# 一次调用转换多个值的版本，没有的转换器逐个转换
+inner_convertors_many: Dict[str, Callable[..., List[str]]] = {
+    "change_case": change_case_many,
+}
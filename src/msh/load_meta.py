@@ -1,14 +1,23 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import ValidationError
 import yaml
-import questionary
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from rich.console import Console
 
+from . import profiling
 from .types import Parameter, TemplateMeta
-from .inner_convertor_executor import exec_inner_convertor
-from .convertor_executor import exec_convertor
-from .msh_constants import TEMPLATE_META_FILES, DEFAULT_NONE_CHOICE
+from .meta_graph import MetaGraph
+from .convertor_executor import (
+    exec_convertor,
+    exec_convertor_batch,
+    prewarm_convertors,
+)
+from .msh_constants import (
+    TEMPLATE_META_FILES,
+    DEFAULT_NONE_CHOICE,
+    SANDBOX_POOL_SIZE,
+)
 
 
 console = Console()
@@ -20,7 +29,10 @@ def try_load_yaml(file_path: str) -> Optional[TemplateMeta]:
     If the file does not exist or is not a valid YAML, returns None.
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
+        with (
+            profiling.span("load_meta", path=file_path),
+            open(file_path, "r", encoding="utf-8") as file,
+        ):
             data = yaml.safe_load(file)
             meta = TemplateMeta(**data)
             return meta
@@ -38,7 +50,11 @@ def try_load_template_meta(template_path: str) -> Optional[TemplateMeta]:
             file_path = f"{template_path}/{meta_file}"
             # file exists
             if os.path.exists(file_path):
-                return try_load_yaml(file_path)
+                template_meta = try_load_yaml(file_path)
+                if template_meta is not None:
+                    check_convertors(template_meta, file_path)
+                    check_partials(template_path)
+                return template_meta
         console.print(
             f"[red]Template meta file [green]({', '.join(TEMPLATE_META_FILES)})[/green] not found in path: [cyan]{template_path}[/cyan][/red]"
         )
@@ -56,50 +72,293 @@ def try_load_template_meta(template_path: str) -> Optional[TemplateMeta]:
         raise SystemExit()
 
 
-def ask_metas(template_meta: TemplateMeta) -> Dict[str, str]:
-    metas: Dict[str, str] = {}
-    for param in template_meta.parameters:
-        if param.ask:
-            question = f"Please input '{param.name}' {'[Required]' if param.required else ''}: {param.description}"
-            ask_meta: str = ask_for_parameter(question, param.required, param.choices)
+def check_convertors(template_meta: TemplateMeta, file_path: str):
+    """
+    Compiles every convertor of the template meta up front, so syntax and
+    signature errors are reported before any prompting starts.
+    """
+    with profiling.span("compile_convertors"):
+        errors = prewarm_convertors(template_meta)
+    if errors:
+        for name, error in errors.items():
+            console.print(
+                f"[red]Invalid convertor for '{name}' in template meta ([cyan]{file_path}[/cyan]): {error}[/red]"
+            )
+        raise SystemExit()
+
+
+def check_partials(template_path: str, file_paths: Optional[List[str]] = None):
+    """
+    Reports the partials the template includes that neither the shared nor
+    the template partials directory has, before any prompting starts.
+    Known `file_paths` save walking the template tree.
+    """
+    from .partials import missing_partials
+    from .template_index import load_template_index
+
+    missing = missing_partials(
+        template_path, load_template_index(template_path, file_paths=file_paths)
+    )
+    if missing:
+        for name, sources in missing.items():
+            console.print(
+                f"[red]Missing partial '{name}' included by: [cyan]{', '.join(sources)}[/cyan][/red]"
+            )
+        raise SystemExit()
 
-            if ask_meta is not None and param.innerConvertor:
-                ask_meta = apply_inner_convertors(param, ask_meta)
 
-            if ask_meta is not None and param.convertor:
-                temp_metas = metas.copy()
-                temp_metas[param.name] = ask_meta
-                ask_meta = apply_convertor(param, temp_metas)
+def ask_metas(
+    template_meta: TemplateMeta, referenced: Optional[Set[str]] = None
+) -> Dict[str, str]:
+    return resolve_metas(template_meta, ask_parameter, referenced)
 
-            if ask_meta is not None:
-                metas[param.name] = ask_meta
-        else:
-            convertor_meta = None
 
-            if param.innerConvertor:
-                if param.target not in metas:
-                    console.print(
-                        f"[red]Error: Target meta '{param.target}' for Parameter '{param.name}' not found.[/red]"
-                    )
-                    raise SystemExit()
+def resolve_metas(
+    template_meta: TemplateMeta,
+    answer: Callable[[Parameter], Optional[str]],
+    referenced: Optional[Set[str]] = None,
+) -> Dict[str, str]:
+    """
+    Run the ask/innerConvertor/convertor pipeline for every parameter.
+    `answer` supplies the value of each `ask` parameter, either by prompting
+    the user or from a pre-filled set of values.
+
+    Parameters are evaluated along the dependency graph of the template meta:
+    every `ask` parameter is answered, derived parameters are evaluated only if
+    `referenced` (the metas used by the template) needs them, or all of them
+    when `referenced` is None. Independent convertors run concurrently.
+    """
+    answers, needed = answer_parameters(template_meta, answer, referenced)
+    with profiling.span("resolve"):
+        return resolve_levels(template_meta.graph, answers, needed)
 
-                target_meta = metas[param.target]
-                convertor_meta = apply_inner_convertors(param, target_meta)
 
-            if param.convertor:
-                convertor_meta = apply_convertor(param, metas)
+def answer_parameters(
+    template_meta: TemplateMeta,
+    answer: Callable[[Parameter], Optional[str]],
+    referenced: Optional[Set[str]] = None,
+) -> Tuple[Dict[str, Optional[str]], Optional[Set[str]]]:
+    """
+    The answers of the `ask` parameters, and the parameters to evaluate for
+    `referenced`, None for all of them, see `resolve_metas`.
+    """
+    with profiling.span("ask"):
+        answers: Dict[str, Optional[str]] = {
+            param.name: answer(param) for param in template_meta.parameters if param.ask
+        }
+    needed = None
+    if referenced is not None:
+        needed = template_meta.graph.closure(set(referenced) | set(answers))
+    return answers, needed
+
+
+def resolve_levels(
+    graph: MetaGraph,
+    answers: Dict[str, Optional[str]],
+    needed: Optional[Set[str]],
+) -> Dict[str, str]:
+    """Evaluate the `needed` parameters level by level, all when None."""
+    metas: Dict[str, str] = {}
+    for level in graph.levels(needed):
+        params = [graph.parameters[name] for name in level]
+        convertor_count = sum(1 for param in params if param.convertor)
+        if convertor_count > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(convertor_count, SANDBOX_POOL_SIZE)
+            ) as executor:
+                results = list(
+                    executor.map(
+                        lambda param: resolve_meta(param, answers, metas, graph),
+                        params,
+                    )
+                )
+        else:
+            results = [resolve_meta(param, answers, metas, graph) for param in params]
 
-            if convertor_meta is not None:
-                metas[param.name] = convertor_meta
+        for param, meta in zip(params, results):
+            if meta is not None:
+                metas[param.name] = meta
 
     return metas
 
 
+def resolve_meta(
+    param: Parameter,
+    answers: Dict[str, Optional[str]],
+    metas: Dict[str, str],
+    graph: MetaGraph,
+) -> Optional[str]:
+    """Evaluate one parameter from the answers and the metas it depends on."""
+    meta, convertor_metas = prepare_meta(param, answers, metas, graph)
+    if convertor_metas is not None:
+        meta = apply_convertor(param, convertor_metas)
+    return meta
+
+
+def prepare_meta(
+    param: Parameter,
+    answers: Dict[str, Optional[str]],
+    metas: Dict[str, str],
+    graph: MetaGraph,
+    inner_meta: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+    """
+    Evaluate one parameter up to its convertor: the value without the
+    convertor, and the metas to call the convertor with, None if it does not
+    run. `inner_meta` is the result of the inner convertors when they were
+    applied already, see `apply_inner_convertors_batch`.
+    """
+    # Convertors only receive the metas they depend on
+    convertor_metas = {
+        name: metas[name] for name in graph.dependencies[param.name] if name in metas
+    }
+
+    if param.ask:
+        ask_meta = answers[param.name]
+
+        if ask_meta is not None and param.innerConvertor:
+            ask_meta = (
+                inner_meta
+                if inner_meta is not None
+                else apply_inner_convertors(param, ask_meta)
+            )
+
+        if ask_meta is not None and param.convertor:
+            convertor_metas[param.name] = ask_meta
+            return ask_meta, convertor_metas
+
+        return ask_meta, None
+
+    convertor_meta = None
+
+    if param.innerConvertor:
+        if param.target not in metas:
+            console.print(
+                f"[red]Error: Target meta '{param.target}' for Parameter '{param.name}' not found.[/red]"
+            )
+            raise SystemExit()
+
+        target_meta = metas[param.target]
+        convertor_meta = (
+            inner_meta
+            if inner_meta is not None
+            else apply_inner_convertors(param, target_meta)
+        )
+
+    if param.convertor:
+        return convertor_meta, convertor_metas
+
+    return convertor_meta, None
+
+
+def resolve_metas_batch(
+    template_meta: TemplateMeta,
+    answers: Dict[str, Callable[[Parameter], Optional[str]]],
+    referenced: Optional[Set[str]] = None,
+) -> Dict[str, Optional[Dict[str, str]]]:
+    """
+    `resolve_metas` for many sets of answers, keyed by a label of each set.
+
+    The sets are evaluated together level by level, so that each convertor
+    runs once per level for all the sets, in one sandbox round trip. A set
+    that fails is reported as `<label>: skipped.` and resolves to None; the
+    other sets carry on.
+    """
+    graph = template_meta.graph
+    asked = [param for param in template_meta.parameters if param.ask]
+    answer_sets: Dict[str, Dict[str, Optional[str]]] = {}
+    with profiling.span("ask", sets=len(answers)):
+        for label, answer in answers.items():
+            try:
+                answer_sets[label] = {param.name: answer(param) for param in asked}
+            except SystemExit:
+                console.print(f"[red]{label}: skipped.[/red]")
+    needed = None
+    if referenced is not None:
+        needed = graph.closure(set(referenced) | {param.name for param in asked})
+
+    metas_sets: Dict[str, Dict[str, str]] = {label: {} for label in answer_sets}
+
+    def skip(label: str):
+        console.print(f"[red]{label}: skipped.[/red]")
+        del metas_sets[label]
+
+    with profiling.span("resolve", sets=len(answer_sets)):
+        for level in graph.levels(needed):
+            # Parameters of a level do not depend on each other, their
+            # convertors run after the whole level is prepared
+            pending: Dict[str, Dict[str, Dict[str, str]]] = {}
+            for name in level:
+                param = graph.parameters[name]
+                inner_metas: Dict[str, Union[str, SystemExit]] = {}
+                if param.innerConvertor:
+                    inner_metas = apply_inner_convertors_batch(
+                        param,
+                        {
+                            label: value
+                            for label, metas in metas_sets.items()
+                            if (
+                                value := answer_sets[label][name]
+                                if param.ask
+                                else metas.get(param.target)
+                            )
+                            is not None
+                        },
+                    )
+                for label, metas in list(metas_sets.items()):
+                    inner_meta = inner_metas.get(label)
+                    if isinstance(inner_meta, SystemExit):
+                        skip(label)
+                        continue
+                    try:
+                        meta, convertor_metas = prepare_meta(
+                            param, answer_sets[label], metas, graph, inner_meta
+                        )
+                    except SystemExit:
+                        skip(label)
+                        continue
+                    if convertor_metas is not None:
+                        pending.setdefault(name, {})[label] = convertor_metas
+                    elif meta is not None:
+                        metas[name] = meta
+
+            params = [graph.parameters[name] for name in pending]
+            if len(params) > 1:
+                with ThreadPoolExecutor(
+                    max_workers=min(len(params), SANDBOX_POOL_SIZE)
+                ) as executor:
+                    results = list(
+                        executor.map(
+                            lambda param: apply_convertor_batch(
+                                param, pending[param.name]
+                            ),
+                            params,
+                        )
+                    )
+            else:
+                results = [
+                    apply_convertor_batch(param, pending[param.name])
+                    for param in params
+                ]
+
+            for param, param_results in zip(params, results):
+                for label, meta in param_results.items():
+                    if label not in metas_sets:
+                        continue
+                    if isinstance(meta, SystemExit):
+                        skip(label)
+                    elif meta is not None:
+                        metas_sets[label][param.name] = meta
+
+    return {label: metas_sets.get(label) for label in answers}
+
+
 def apply_convertor(param: Parameter, temp_metas: Dict[str, str]) -> str:
     convertor_meta = None
     console.print(f"[blue]$[/blue] [yellow]Converting meta for '{param.name}'[/yellow]")
     try:
-        convertor_meta = exec_convertor(param.convertor, temp_metas)
+        with profiling.span(param.name, "convertor"):
+            convertor_meta = exec_convertor(param.convertor, temp_metas)
     except Exception as e:
         console.print(f"[red] Error converting meta for '{param.name}': {e}[/red]")
         raise SystemExit()
@@ -109,17 +368,57 @@ def apply_convertor(param: Parameter, temp_metas: Dict[str, str]) -> str:
     return convertor_meta
 
 
+def apply_convertor_batch(
+    param: Parameter, temp_metas: Dict[str, Dict[str, str]]
+) -> Dict[str, Union[Optional[str], SystemExit]]:
+    """
+    `apply_convertor` for many sets of metas keyed by set label, in one
+    sandbox round trip. A set that fails is reported and gets a SystemExit
+    instead of its meta.
+    """
+    console.print(
+        f"[blue]$[/blue] [yellow]Converting meta for '{param.name}' ({len(temp_metas)} sets)[/yellow]"
+    )
+    labels = list(temp_metas)
+    try:
+        # One span for the whole batch, counting a call per set
+        with profiling.span(param.name, "convertor", calls=len(labels)):
+            results = exec_convertor_batch(
+                param.convertor, [temp_metas[label] for label in labels]
+            )
+    except Exception as e:
+        console.print(f"[red] Error converting meta for '{param.name}': {e}[/red]")
+        return {label: SystemExit() for label in labels}
+
+    metas: Dict[str, Union[Optional[str], SystemExit]] = {}
+    for label, result in zip(labels, results):
+        if isinstance(result, Exception):
+            console.print(
+                f"[red] Error converting meta for '{param.name}' ({label}): {result}[/red]"
+            )
+            metas[label] = SystemExit()
+            continue
+        if param.required and result is None:
+            console.print(
+                f"[red]Render Error: Parameter '{param.name}' is required but convert to None ({label}).[/red]"
+            )
+            metas[label] = SystemExit()
+            continue
+        metas[label] = result
+    return metas
+
+
 def apply_inner_convertors(param: Parameter, meta: str) -> str:
-    convertor_meta = None
-    for convertor in param.innerConvertor:
+    convertor_meta = meta
+    for name, convertor in param.inner_pipeline:
         console.print(
-            f"[blue]$[/blue] [yellow]Applying inner convertor '{convertor.name}' for '{param.name}'[/yellow]"
+            f"[blue]$[/blue] [yellow]Applying inner convertor '{name}' for '{param.name}'[/yellow]"
         )
         try:
-            convertor_meta = exec_inner_convertor(convertor, meta)
+            convertor_meta = convertor(convertor_meta)
         except Exception as e:
             console.print(
-                f"[red]Error applying inner convertor '{convertor.name}' for '{param.name}': {e}[/red]"
+                f"[red]Error applying inner convertor '{name}' for '{param.name}': {e}[/red]"
             )
             raise SystemExit()
 
@@ -128,6 +427,44 @@ def apply_inner_convertors(param: Parameter, meta: str) -> str:
     return convertor_meta
 
 
+def apply_inner_convertors_batch(
+    param: Parameter, values: Dict[str, str]
+) -> Dict[str, Union[str, SystemExit]]:
+    """
+    `apply_inner_convertors` for the values of many sets keyed by set label,
+    each inner convertor converting all of them in one call, see
+    `Parameter.inner_pipeline_many`. A set that fails is reported and gets a
+    SystemExit instead of its meta.
+    """
+    results: Dict[str, Union[str, SystemExit]] = {}
+    if not values:
+        return results
+    labels = list(values)
+    converted = [values[label] for label in labels]
+    for name, convertor_many in param.inner_pipeline_many:
+        console.print(
+            f"[blue]$[/blue] [yellow]Applying inner convertor '{name}' for '{param.name}' ({len(labels)} sets)[/yellow]"
+        )
+        try:
+            converted = convertor_many(converted)
+        except Exception:
+            # Convert one value at a time to tell which sets fail
+            for label in labels:
+                try:
+                    results[label] = apply_inner_convertors(param, values[label])
+                except SystemExit as e:
+                    results[label] = e
+            return results
+    for label, meta in zip(labels, converted):
+        try:
+            check_meta_required(param, meta)
+        except SystemExit as e:
+            results[label] = e
+            continue
+        results[label] = meta
+    return results
+
+
 def check_meta_required(param: Parameter, meta: str | None):
     if param.required and meta is None:
         console.print(
@@ -136,9 +473,48 @@ def check_meta_required(param: Parameter, meta: str | None):
         raise SystemExit()
 
 
+def ask_parameter(param: Parameter) -> Optional[str]:
+    question = f"Please input '{param.name}' {'[Required]' if param.required else ''}: {param.description}"
+    return ask_for_parameter(question, param.required, param.choices)
+
+
+def answer_from_values(
+    values: Dict[str, Any],
+) -> Callable[[Parameter], Optional[str]]:
+    """
+    Build an `answer` callback for `resolve_metas` that reads `ask` parameters
+    from `values` instead of prompting, applying the same required/choices
+    checks as the interactive prompt.
+    """
+
+    def answer(param: Parameter) -> Optional[str]:
+        value = values.get(param.name)
+        value = str(value).strip() if value is not None else ""
+
+        if not value or value == DEFAULT_NONE_CHOICE:
+            if param.required:
+                console.print(
+                    f"[red]Error: Parameter '{param.name}' is required but no value was provided.[/red]"
+                )
+                raise SystemExit()
+            return None
+
+        if param.choices and value not in param.choices:
+            console.print(
+                f"[red]Error: Value '{value}' for Parameter '{param.name}' is not one of: {', '.join(param.choices)}.[/red]"
+            )
+            raise SystemExit()
+
+        return value
+
+    return answer
+
+
 def ask_for_parameter(
     question: str, required: bool, choices: Optional[List[str]]
 ) -> str:
+    import questionary
+
     if required:
         while True:
             if choices:
@@ -1,84 +1,268 @@
+import argparse
 import os
-from pathlib import Path
-from typing import List
-from rich.console import Console
-import questionary
-import time
-from .render import render_template
-from .load_meta import try_load_template_meta, ask_metas
 from .msh_constants import (
+    DEFAULT_PARTIALS_PATH,
     DEFAULT_TEMPLATES_PATH,
-    DEFAULT_OUTPUT_PATH,
-    OUTPUT_TIMESTAMP_FORMAT,
+    FSYNC_POLICIES,
+    OUTPUT_SINKS,
+    PROFILE_FORMATS,
+    RENDER_CACHE_MAX_SIZE,
+    RENDER_CACHE_PATH,
+    RENDER_CONCURRENCY_MODES,
 )
+from .version import package_version
 
-console = Console()
+# Commands import rich, questionary, pydantic, chevron and RestrictedPython
+# only when they run, so `msh --version` and `msh --list` start without them.
 
 
-def get_output_path(template_name) -> str:
-    timestamp = time.strftime(OUTPUT_TIMESTAMP_FORMAT, time.localtime())
-    return f"{DEFAULT_OUTPUT_PATH}/{template_name}_{timestamp}"
-
-
-def list_dirs(directory: str) -> List[str]:
-    """List all dirs in the given directory."""
+def list_templates():
     try:
-        return [
+        templates = sorted(
             f
-            for f in os.listdir(directory)
-            if os.path.isdir(os.path.join(directory, f))
-        ]
+            for f in os.listdir(DEFAULT_TEMPLATES_PATH)
+            if os.path.isdir(os.path.join(DEFAULT_TEMPLATES_PATH, f))
+        )
     except FileNotFoundError:
-        console.print(f"[red]Directory '{directory}' not found.[/red]")
-        raise SystemExit()
+        print(f"Directory '{DEFAULT_TEMPLATES_PATH}' not found.")
+        raise SystemExit(1)
+    for template in templates:
+        print(template)
 
 
-def choose_template() -> dict:
-    templates = list_dirs(DEFAULT_TEMPLATES_PATH)
-    if len(templates) == 1:
-        console.print(
-            f"Only one template found: [magenta]{templates[0]}[/magenta]. Using it by default."
-        )
-        return {
-            "name": templates[0],
-            "path": f"{DEFAULT_TEMPLATES_PATH}/{templates[0]}",
-        }
-    choose_template = questionary.select(
-        "Which one template do you want to use?",
-        choices=templates,
-    ).ask()
-
-    if choose_template is None:
-        console.print("[red]Operation cancelled by user.[/red]")
-        raise SystemExit()
-
-    console.print(f"You have chosen template: [magenta]{choose_template}[/magenta].")
-    return {
-        "name": choose_template,
-        "path": f"{DEFAULT_TEMPLATES_PATH}/{choose_template}",
-    }
+def add_render_arguments(parser: argparse.ArgumentParser, defaults: bool = True):
+    """
+    Options of the render commands. A subcommand adds them again without
+    `defaults`, so they may be given before or after it: its defaults
+    would otherwise override the values given before it.
+    """
+
+    def default(value=None):
+        return value if defaults else argparse.SUPPRESS
+
+    parser.add_argument(
+        "--concurrency",
+        choices=RENDER_CONCURRENCY_MODES,
+        default=default("serial"),
+        help="Render files serially, on a thread pool (I/O bound) or a process pool (CPU bound).",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=default(), help="Number of render workers."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=default(False),
+        help="Only re-render and rewrite the output files whose inputs changed (needs --output).",
+    )
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default=default("none"),
+        help="Flush output files to disk: never, as each is written, or all at the end.",
+    )
+    parser.add_argument(
+        "--sink",
+        metavar="FORMAT[:PATH]",
+        default=default(),
+        help=f"Write the output as {', '.join(OUTPUT_SINKS)} to PATH or stdout (-) instead of a directory.",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        default=default(),
+        help=f"Reuse files rendered before from the same content and metas, cached in DIR (e.g. {RENDER_CACHE_PATH}).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        metavar="MB",
+        type=int,
+        default=default(RENDER_CACHE_MAX_SIZE // (1024 * 1024)),
+        help="Evict the least recently used cached files beyond this size.",
+    )
+    parser.add_argument(
+        "--cache-link",
+        action="store_true",
+        default=default(False),
+        help="Hard link cached files into the output instead of copying them (read-only outputs).",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=default(False),
+        help="Print how long each stage, file and convertor took.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        default=default(),
+        help="Write the timings of the run to FILE.",
+    )
+    parser.add_argument(
+        "--profile-format",
+        choices=PROFILE_FORMATS,
+        default=default("json"),
+        help="Format of --profile: spans and summary as JSON, or a Chrome trace.",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="msh", description="Render code from Mustache templates."
+    )
+    parser.add_argument(
+        "--version", action="store_true", help="Show the version and exit."
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the available templates and exit."
+    )
+    parser.add_argument(
+        "-o", "--output", help="Output directory, a new timestamped one by default."
+    )
+    parser.add_argument(
+        "--partials",
+        metavar="DIR",
+        help=f"Shared partials directory, {DEFAULT_PARTIALS_PATH} by default.",
+    )
+    parser.add_argument(
+        "--lint",
+        action="store_true",
+        help="Report parameters the template never uses and variables it never declares.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show which output files would be created or overwritten, without writing.",
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="With --dry-run, render contents too and show the diff of overwritten files.",
+    )
+    add_render_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Render many parameter sets from a manifest without prompts."
+    )
+    batch_parser.add_argument(
+        "manifest", help="YAML or JSONL manifest holding the parameter sets."
+    )
+    batch_parser.add_argument(
+        "-t",
+        "--template",
+        default=None,
+        help="Template used by sets that do not name one.",
+    )
+    batch_parser.add_argument(
+        "-o",
+        "--output",
+        default=argparse.SUPPRESS,
+        help="Root directory of the rendered sets.",
+    )
+    add_render_arguments(batch_parser, defaults=False)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Render once, then re-render what each template edit affects."
+    )
+    watch_parser.add_argument(
+        "-t", "--template", help="Template to watch, chosen interactively by default."
+    )
+    watch_parser.add_argument(
+        "-o",
+        "--output",
+        default=argparse.SUPPRESS,
+        help="Output directory, a new timestamped one by default.",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll for changes instead of using inotify.",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve render requests over HTTP with warm caches."
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8765, help="Port to listen on."
+    )
+    serve_parser.add_argument(
+        "--socket", help="Listen on this Unix socket instead of a TCP port."
+    )
+    serve_parser.add_argument(
+        "--output-root",
+        metavar="DIR",
+        help="Let requests render into directories under DIR, disabled by default.",
+    )
+    return parser
+
+
+def check_subcommand_options(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Reject the top-level options a subcommand would silently ignore."""
+    if args.command in ("watch", "serve"):
+        # Render, plan and lint options, as set by default
+        ignored = argparse.ArgumentParser(add_help=False)
+        for flag in ("--dry-run", "--diff", "--lint"):
+            ignored.add_argument(flag, action="store_true")
+        add_render_arguments(ignored)
+        flags = [
+            max(action.option_strings, key=len)
+            for action in ignored._actions
+            if getattr(args, action.dest) != action.default
+        ]
+        if flags:
+            parser.error(f"{', '.join(flags)} cannot be used with {args.command}")
+    if args.command == "batch" and args.lint:
+        parser.error("--lint cannot be used with batch")
 
 
 def main():
-    console.print("[cyan]1. Choose template:[/cyan]")
-    template_info = choose_template()
-    template_meta = try_load_template_meta(template_info["path"])
-    console.print("\n[cyan]2. Ask metas for template:[/cyan]")
-    metas = ask_metas(template_meta)
-    output_path = get_output_path(template_info["name"])
-    Path(output_path).mkdir(parents=True, exist_ok=True)
-    console.print(
-        f"\n[cyan]3. Rendering template to path: [magenta]{output_path}[/magenta][/cyan]"
-    )
-    render_template(
-        template_path=template_info["path"],
-        output_path=output_path,
-        metas=metas,
-    )
-    console.print(
-        f"\n[green]√：Template rendered successfully to: [magenta]{output_path}[/magenta][/green]"
+    parser = build_parser()
+    args = parser.parse_args()
+    check_subcommand_options(parser, args)
+    if args.version:
+        print(f"msh {package_version()}")
+        return
+    if args.list:
+        list_templates()
+        return
+    if args.partials is not None:
+        from .partials import set_shared_partials_path
+
+        set_shared_partials_path(args.partials)
+    if args.command == "serve":
+        from .server import serve
+
+        serve(args.host, args.port, args.socket, output_root=args.output_root)
+        return
+
+    if args.command == "watch":
+        from .commands import watch
+
+        watch(args)
+        return
+
+    from .commands import (
+        batch,
+        interactive,
+        lint,
+        output_sink,
+        profiled,
+        render_cache,
     )
 
+    if args.lint:
+        lint()
+        return
+    with output_sink(args) as sink, render_cache(args) as cache, profiled(args):
+        if args.command == "batch":
+            batch(args, sink, cache)
+        else:
+            interactive(args, sink, cache)
+
 
 if __name__ == "__main__":
     main()
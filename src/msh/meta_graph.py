@@ -0,0 +1,145 @@
+import ast
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+if TYPE_CHECKING:
+    from .types import Parameter
+
+
+def convertor_dependencies(func_str: str) -> Optional[Set[str]]:
+    """
+    Collects the parameter names a convertor reads through `params.get('x')`,
+    `params['x']` or `'x' in params`.
+    Returns None when `params` is used in any other way (iterated, passed on,
+    indexed by a variable...), since the keys it reads cannot be known.
+    """
+    try:
+        module_ast = ast.parse(func_str)
+    except SyntaxError:
+        return None
+    function_defs = [
+        node for node in module_ast.body if isinstance(node, ast.FunctionDef)
+    ]
+    if not function_defs or not function_defs[0].args.args:
+        return None
+    func_ast = function_defs[0]
+    params_name = func_ast.args.args[0].arg
+
+    parents: Dict[ast.AST, ast.AST] = {}
+    for node in ast.walk(func_ast):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    keys: Set[str] = set()
+    for node in ast.walk(func_ast):
+        if not (isinstance(node, ast.Name) and node.id == params_name):
+            continue
+        parent = parents.get(node)
+        key = None
+        if (
+            isinstance(parent, ast.Attribute)
+            and parent.attr == "get"
+            and isinstance(parents.get(parent), ast.Call)
+            and parents[parent].func is parent
+            and parents[parent].args
+        ):
+            key = parents[parent].args[0]
+        elif isinstance(parent, ast.Subscript) and parent.value is node:
+            key = parent.slice
+        elif (
+            isinstance(parent, ast.Compare)
+            and len(parent.ops) == 1
+            and isinstance(parent.ops[0], (ast.In, ast.NotIn))
+            and parent.comparators[0] is node
+        ):
+            key = parent.left
+
+        if isinstance(key, ast.Constant) and isinstance(key.value, str):
+            keys.add(key.value)
+        else:
+            return None
+    return keys
+
+
+class MetaGraph:
+    """
+    Dependency graph of template parameters.
+
+    A parameter depends on its `target` (innerConvertor of a derived
+    parameter) and on the parameters its `convertor` reads. Convertors whose
+    reads cannot be determined statically depend on every parameter declared
+    before them, which is what they received before the graph existed.
+    """
+
+    def __init__(self, parameters: List["Parameter"]):
+        self.parameters: Dict[str, "Parameter"] = {
+            param.name: param for param in parameters
+        }
+        self.dependencies: Dict[str, Set[str]] = {}
+
+        declared: List[str] = []
+        for param in parameters:
+            dependencies: Set[str] = set()
+            if param.target and not param.ask:
+                if param.target not in self.parameters:
+                    raise ValueError(
+                        f"Target '{param.target}' of parameter '{param.name}' is not defined."
+                    )
+                dependencies.add(param.target)
+            if param.convertor:
+                keys = convertor_dependencies(param.convertor)
+                if keys is None:
+                    dependencies.update(declared)
+                else:
+                    dependencies.update(key for key in keys if key in self.parameters)
+            dependencies.discard(param.name)
+            self.dependencies[param.name] = dependencies
+            declared.append(param.name)
+
+        self._check_cycles()
+
+    def _check_cycles(self):
+        visiting: List[str] = []
+        done: Set[str] = set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                cycle = visiting[visiting.index(name) :] + [name]
+                raise ValueError(f"Circular parameter dependency: {' -> '.join(cycle)}")
+            visiting.append(name)
+            for dependency in sorted(self.dependencies[name]):
+                visit(dependency)
+            visiting.pop()
+            done.add(name)
+
+        for name in self.parameters:
+            visit(name)
+
+    def closure(self, names: Iterable[str]) -> Set[str]:
+        """The given parameters and everything they depend on, transitively."""
+        needed: Set[str] = set()
+        pending = [name for name in names if name in self.parameters]
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.dependencies[name])
+        return needed
+
+    def levels(self, names: Optional[Set[str]] = None) -> List[List[str]]:
+        """
+        Groups parameters into evaluation levels: each level depends only on
+        earlier levels, so the parameters of one level can run concurrently.
+        Parameters keep their declaration order within a level.
+        """
+        remaining = [name for name in self.parameters if names is None or name in names]
+        levels: List[List[str]] = []
+        while remaining:
+            pending = set(remaining)
+            level = [
+                name for name in remaining if not self.dependencies[name] & pending
+            ]
+            levels.append(level)
+            remaining = [name for name in remaining if name not in level]
+        return levels
@@ -3,3 +3,27 @@ DEFAULT_NONE_CHOICE = "[None]"
 DEFAULT_TEMPLATES_PATH = "./templates"
 DEFAULT_OUTPUT_PATH = "./output"
 OUTPUT_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+TEMPLATE_CACHE_SIZE = 1024
+RENDER_CONCURRENCY_MODES = ["serial", "thread", "process"]
+CONVERTOR_CACHE_SIZE = 256
+SANDBOX_POOL_SIZE = 4
+SANDBOX_START_TIMEOUT = 30.0
+INCREMENTAL_MANIFEST_FILE = ".msh_manifest.json"
+TEMPLATE_INDEX_FILE = ".msh_index.json"
+STREAM_RENDER_THRESHOLD = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+PROFILE_FORMATS = ["json", "chrome"]
+REGISTRY_CACHE_FILE = "./.msh_cache/registry.json"
+CASE_CACHE_SIZE = 4096
+FSYNC_POLICIES = ["none", "per-file", "at-end"]
+ASYNC_RENDER_WORKERS = 8
+OUTPUT_SINKS = ["zip", "tar", "tar.gz", "jsonl"]
+WATCH_DEBOUNCE = 0.2
+WATCH_POLL_INTERVAL = 0.5
+DEFAULT_PARTIALS_PATH = "./partials"
+TEMPLATE_PARTIALS_DIR = "_partials"
+PARTIALS_EXTENSION = ".mustache"
+RENDER_CACHE_PATH = "./.msh_cache/render"
+RENDER_CACHE_MAX_SIZE = 512 * 1024 * 1024
+SERVER_REVALIDATE_INTERVAL = 1.0
+STREAM_MAX_CHUNK_SIZE = 4 * 1024 * 1024
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from chevron import ChevronError
+
+from .msh_constants import (
+    DEFAULT_PARTIALS_PATH,
+    PARTIALS_EXTENSION,
+    TEMPLATE_PARTIALS_DIR,
+)
+from .template_cache import Tokens, template_cache
+
+if TYPE_CHECKING:
+    from .template_index import TemplateIndex
+
+Partials = Dict[str, Tokens]
+
+# Shared partials directory, set from `--partials`
+shared_partials_path = DEFAULT_PARTIALS_PATH
+
+# Parsed partials of each directory, with the (mtime, size) of their files
+_libraries: Dict[str, Tuple[Dict[str, Tuple[int, int]], Partials]] = {}
+_libraries_lock = threading.Lock()
+
+
+def set_shared_partials_path(path: str):
+    global shared_partials_path
+    shared_partials_path = path
+
+
+def get_shared_partials_path() -> str:
+    return shared_partials_path
+
+
+def partial_name(relative_path: str) -> str:
+    """`{{> header}}` names `header.mustache`, any other file by its full name."""
+    if relative_path.endswith(PARTIALS_EXTENSION):
+        return relative_path[: -len(PARTIALS_EXTENSION)]
+    return relative_path
+
+
+def load_partial_directory(directory: str) -> Partials:
+    """
+    Parse every file of a partials directory, keyed by partial name. The
+    result is kept in memory and parsed again only when a file was added,
+    removed or changed.
+    """
+    snapshot: Dict[str, Tuple[int, int]] = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            stat = os.stat(file_path)
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+
+    with _libraries_lock:
+        cached = _libraries.get(directory)
+    if cached is not None and cached[0] == snapshot:
+        return cached[1]
+
+    partials: Partials = {}
+    for file_path in sorted(snapshot):
+        relative_path = Path(os.path.relpath(file_path, directory)).as_posix()
+        partials[partial_name(relative_path)] = template_cache.compile_file(file_path)
+    with _libraries_lock:
+        _libraries[directory] = (snapshot, partials)
+    return partials
+
+
+def load_partials(template_path: str) -> Partials:
+    """
+    Partials available to a template: the shared partials directory, then
+    the `_partials` directory of the template, which wins on equal names.
+    """
+    partials: Partials = {}
+    for directory in (
+        shared_partials_path,
+        os.path.join(template_path, TEMPLATE_PARTIALS_DIR),
+    ):
+        if directory and os.path.isdir(directory):
+            partials.update(load_partial_directory(directory))
+    return partials
+
+
+def partials_digest(partials: Partials) -> str:
+    """Hash of a partial library, changing whenever any partial does."""
+    return hashlib.sha256(repr(sorted(partials.items())).encode("utf-8")).hexdigest()
+
+
+def partial_references(tokens: Tokens) -> Set[str]:
+    return {key for tag, key in tokens if tag == "partial"}
+
+
+def missing_partials(
+    template_path: str, index: "TemplateIndex", partials: Optional[Partials] = None
+) -> Dict[str, List[str]]:
+    """
+    Partials referenced by template files or by other partials that do not
+    exist, with what references them. Only files whose variables the `index`
+    could not tell (because of partials) are parsed; files that do not parse
+    are left for rendering to report.
+    """
+    if partials is None:
+        partials = load_partials(template_path)
+    sources: List[Tuple[str, Tokens]] = []
+    for relative_path, indexed_file in index.files.items():
+        try:
+            if indexed_file.path_names is None:
+                sources.append((relative_path, template_cache.compile(relative_path)))
+            if indexed_file.body_names is None and not indexed_file.binary:
+                file_path = os.path.join(template_path, relative_path)
+                sources.append((relative_path, template_cache.compile_file(file_path)))
+        except (ChevronError, UnicodeDecodeError):
+            continue
+    sources.extend((f"partial {name}", tokens) for name, tokens in partials.items())
+
+    missing: Dict[str, List[str]] = {}
+    for source, tokens in sources:
+        for name in sorted(partial_references(tokens)):
+            if name not in partials:
+                missing.setdefault(name, []).append(source)
+    return missing
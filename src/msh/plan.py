@@ -0,0 +1,141 @@
+import difflib
+import hashlib
+import os
+from typing import Dict, Iterator, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from .render import render_path, rendered_bytes, walk_files
+from .partials import load_partials
+from .template_index import TemplateIndex, load_template_index
+
+
+class PlannedFile(BaseModel):
+    """
+    One output file of a render plan. `action` is `create` or `overwrite`,
+    or `unchanged` when the content was rendered and equals the file on disk.
+    """
+
+    source: str
+    output: str
+    action: Literal["create", "overwrite", "unchanged"]
+    size: Optional[int] = None
+    new_size: Optional[int] = None
+    diff: Optional[str] = None
+
+
+class RenderPlan(BaseModel):
+    files: List[PlannedFile] = Field(default_factory=list)
+
+    def count(self, action: str) -> int:
+        return sum(1 for file in self.files if file.action == action)
+
+
+def file_diff(output_file_path: str, rendered: bytes) -> str:
+    try:
+        with open(output_file_path, "rb") as file:
+            current = file.read().decode("utf-8")
+        new = rendered.decode("utf-8")
+    except UnicodeDecodeError:
+        return "Binary files differ\n"
+    return "".join(
+        difflib.unified_diff(
+            current.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile=output_file_path,
+            tofile=f"{output_file_path} (rendered)",
+        )
+    )
+
+
+def compare_content(
+    planned: PlannedFile,
+    chunks: Iterator[bytes],
+    diff: bool,
+    diff_limit: int,
+):
+    """Fill in the rendered size, whether it changes the file and its diff."""
+    if planned.action == "create":
+        planned.new_size = sum(len(chunk) for chunk in chunks)
+        return
+
+    if diff and planned.size is not None and planned.size <= diff_limit:
+        rendered = b"".join(chunks)
+        planned.new_size = len(rendered)
+        if rendered == read_file(planned.output):
+            planned.action = "unchanged"
+        else:
+            planned.diff = file_diff(planned.output, rendered)
+        return
+
+    # Too large to diff, compare hashes chunk by chunk
+    rendered_hash = hashlib.sha256()
+    new_size = 0
+    for chunk in chunks:
+        rendered_hash.update(chunk)
+        new_size += len(chunk)
+    planned.new_size = new_size
+    if new_size == planned.size and rendered_hash.digest() == file_hash(planned.output):
+        planned.action = "unchanged"
+
+
+def read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def file_hash(file_path: str) -> bytes:
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.digest()
+
+
+def plan_render(
+    template_path: str,
+    output_path: str,
+    metas: dict,
+    files: Optional[Dict[str, Optional[str]]] = None,
+    index: Optional[TemplateIndex] = None,
+    content: bool = False,
+    diff: bool = False,
+    diff_limit: int = 1024 * 1024,
+) -> RenderPlan:
+    """
+    Compute the output files `render_template` would produce into
+    `output_path` without writing anything: only path templates are
+    rendered, and which files exist is read from disk.
+    With `content`, file contents are rendered too to tell unchanged files
+    and the new sizes; with `diff`, overwritten files up to `diff_limit`
+    bytes also get a unified diff. Large files are rendered chunk by chunk.
+    """
+    if index is None:
+        index = load_template_index(template_path)
+
+    plan = RenderPlan()
+    partials = load_partials(template_path) if content or diff else None
+    for file_path in files if files is not None else walk_files(template_path):
+        rendered_path = render_path(file_path, metas)
+        output_file_path = rendered_path.replace(template_path, output_path)
+        try:
+            size = os.stat(output_file_path).st_size
+            action = "overwrite"
+        except FileNotFoundError:
+            size = None
+            action = "create"
+        planned = PlannedFile(
+            source=file_path, output=output_file_path, action=action, size=size
+        )
+
+        if content or diff:
+            chunks = rendered_bytes(
+                file_path,
+                metas,
+                files[file_path] if files is not None else None,
+                index.has_tags(template_path, file_path),
+                index.can_stream(template_path, file_path),
+                partials,
+            )
+            compare_content(planned, chunks, diff, diff_limit)
+        plan.files.append(planned)
+    return plan
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pydantic import BaseModel, Field
+
+
+class Span(BaseModel):
+    """One timed step of a render run, times in seconds from `time.perf_counter`."""
+
+    name: str
+    category: str
+    start: float
+    duration: float
+    thread: int
+    args: Dict[str, Any] = Field(default_factory=dict)
+
+
+Hook = Callable[[Span], None]
+
+# Recording is off, and costs one list check, while no hook is installed
+_hooks: List[Hook] = []
+_hooks_lock = threading.Lock()
+
+
+def add_hook(hook: Hook):
+    """Call `hook` with every span recorded from now on, from any thread."""
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Hook):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+
+def record(name: str, category: str, start: float, duration: float, **args):
+    """Record a span measured by the caller."""
+    if not _hooks:
+        return
+    span = Span(
+        name=name,
+        category=category,
+        start=start,
+        duration=duration,
+        thread=threading.get_ident(),
+        args=args,
+    )
+    for hook in list(_hooks):
+        hook(span)
+
+
+@contextmanager
+def span(name: str, category: str = "stage", **args) -> Iterator[Optional[dict]]:
+    """
+    Time the enclosed block. Yields the span args, for the block to add
+    counters such as bytes written, or None while recording is off.
+    """
+    if not _hooks:
+        yield None
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        record(name, category, start, time.perf_counter() - start, **args)
+
+
+class Profiler:
+    """
+    Collects the spans of a run while active:
+
+        with Profiler() as profiler:
+            render_template(...)
+        profiler.summary()
+
+    Files rendered on a process pool are timed in the workers and not
+    collected.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def __call__(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def __enter__(self) -> "Profiler":
+        self.origin = time.perf_counter()
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_hook(self)
+
+    def by_category(self, category: str) -> List[Span]:
+        return [span for span in self.spans if span.category == category]
+
+    def summary(self) -> dict:
+        stages: Dict[str, float] = {}
+        for span in self.by_category("stage"):
+            stages[span.name] = stages.get(span.name, 0.0) + span.duration
+
+        convertors: Dict[str, dict] = {}
+        for span in self.by_category("convertor"):
+            # A batched call converts `calls` values in one span, its values
+            # count as calls of the mean duration
+            calls = span.args.get("calls", 1)
+            stats = convertors.setdefault(
+                span.name, {"calls": 0, "total": 0.0, "max": 0.0}
+            )
+            stats["calls"] += calls
+            stats["total"] += span.duration
+            stats["max"] = max(stats["max"], span.duration / calls)
+        for stats in convertors.values():
+            stats["mean"] = stats["total"] / stats["calls"]
+
+        files = self.by_category("file")
+        sandbox = self.by_category("sandbox")
+        return {
+            "stages": stages,
+            "convertors": convertors,
+            "files": {
+                "count": len(files),
+                "total": sum(span.duration for span in files),
+                "bytes_read": sum(span.args.get("bytes_read", 0) for span in files),
+                "bytes_written": sum(
+                    span.args.get("bytes_written", 0) for span in files
+                ),
+                "slowest": [
+                    {"path": span.name, "duration": span.duration, **span.args}
+                    for span in sorted(files, key=lambda s: s.duration, reverse=True)[
+                        :10
+                    ]
+                ],
+            },
+            "sandbox": {
+                "calls": len(sandbox),
+                "total": sum(span.duration for span in sandbox),
+                "overhead": sum(span.args.get("overhead", 0.0) for span in sandbox),
+            },
+        }
+
+    def to_json(self) -> dict:
+        return {
+            "spans": [
+                {**span.model_dump(), "start": span.start - self.origin}
+                for span in self.spans
+            ],
+            "summary": self.summary(),
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """Trace Event Format, for chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start - self.origin) * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": span.thread,
+                    "args": span.args,
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export(self, file_path: str, format: str = "json"):
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=2 if format == "json" else None)
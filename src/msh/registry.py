@@ -0,0 +1,197 @@
+import os
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from rich.console import Console
+
+from .types import TemplateMeta
+from .load_meta import check_partials, try_load_template_meta
+from .render import is_template_file
+from .version import package_version
+from .msh_constants import (
+    DEFAULT_TEMPLATES_PATH,
+    REGISTRY_CACHE_FILE,
+    TEMPLATE_META_FILES,
+    TEMPLATE_PARTIALS_DIR,
+)
+
+
+console = Console()
+
+
+class RegistryEntry(BaseModel):
+    """A template as last loaded, with what is needed to tell it changed."""
+
+    name: str
+    path: str
+    meta_file: str
+    meta_mtime: int
+    # mtime of every directory of the template tree, changed by adding,
+    # removing or renaming files in it
+    directories: Dict[str, int]
+    meta: TemplateMeta
+    files: List[str]
+
+
+class RegistryCache(BaseModel):
+    """The registry as saved, valid for one msh version and templates directory."""
+
+    version: str
+    templates_path: str
+    mtime: Optional[int]
+    names: List[str]
+    entries: Dict[str, RegistryEntry]
+
+
+def scan_template(template_path: str) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Directory mtimes and template files of a template tree, in one walk.
+    The partials directory counts for the mtimes but holds no template files.
+    """
+    directories: Dict[str, int] = {}
+    files: List[str] = []
+    partials_path = os.path.join(template_path, TEMPLATE_PARTIALS_DIR)
+    for root, _, filenames in os.walk(template_path):
+        directories[root] = os.stat(root).st_mtime_ns
+        if root == partials_path or root.startswith(partials_path + os.sep):
+            continue
+        for filename in filenames:
+            if is_template_file(filename):
+                files.append(os.path.join(root, filename))
+    return directories, sorted(files)
+
+
+def entry_is_current(entry: RegistryEntry) -> bool:
+    try:
+        if os.stat(entry.meta_file).st_mtime_ns != entry.meta_mtime:
+            return False
+        return all(
+            os.stat(directory).st_mtime_ns == mtime
+            for directory, mtime in entry.directories.items()
+        )
+    except FileNotFoundError:
+        return False
+
+
+class TemplateRegistry:
+    """
+    Template names, validated metas and file lists, cached in a local JSON
+    file so listing and loading templates from a large or remote library does
+    not crawl it and parse YAML on every run.
+
+    The template list is trusted while the templates directory mtime is
+    unchanged, a template while its meta file and directory mtimes are. The
+    partials a cached template includes are checked on every load.
+    """
+
+    def __init__(
+        self,
+        templates_path: str = DEFAULT_TEMPLATES_PATH,
+        cache_file: str = REGISTRY_CACHE_FILE,
+    ):
+        self.templates_path = templates_path
+        self.cache_file = cache_file
+        self.mtime: Optional[int] = None
+        self.template_names: List[str] = []
+        self.entries: Dict[str, RegistryEntry] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as file:
+                cache = RegistryCache.model_validate_json(file.read())
+        except (OSError, UnicodeDecodeError, ValidationError):
+            # Missing, unreadable or not a registry cache, rebuild it
+            return
+        if (
+            cache.version != package_version()
+            or cache.templates_path != os.path.abspath(self.templates_path)
+        ):
+            return
+        self.mtime = cache.mtime
+        self.template_names = cache.names
+        self.entries = cache.entries
+
+    def save(self):
+        cache = RegistryCache(
+            version=package_version(),
+            templates_path=os.path.abspath(self.templates_path),
+            mtime=self.mtime,
+            names=self.template_names,
+            entries=self.entries,
+        )
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(temp_file, "w", encoding="utf-8") as file:
+                file.write(cache.model_dump_json())
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            # The cache is an optimization, a read-only working directory is fine
+            pass
+
+    def names(self) -> List[str]:
+        """Names of the templates, sorted."""
+        try:
+            mtime = os.stat(self.templates_path).st_mtime_ns
+        except FileNotFoundError:
+            console.print(f"[red]Directory '{self.templates_path}' not found.[/red]")
+            raise SystemExit()
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.template_names = sorted(
+                f
+                for f in os.listdir(self.templates_path)
+                if os.path.isdir(os.path.join(self.templates_path, f))
+            )
+            self.entries = {
+                name: entry
+                for name, entry in self.entries.items()
+                if name in self.template_names
+            }
+            self.save()
+        return self.template_names
+
+    def get(self, name: str) -> RegistryEntry:
+        """
+        Load a template, from the cache if it did not change.
+        Errors in the template meta are reported and exit like
+        `try_load_template_meta`.
+        """
+        entry = self.entries.get(name)
+        if entry is not None and entry_is_current(entry):
+            # Partials may have been removed, or newly included by an edited
+            # file, without the cached entry changing
+            check_partials(entry.path, entry.files)
+            return entry
+
+        template_path = f"{self.templates_path}/{name}"
+        # Scan before loading, so a change made meanwhile is caught next time
+        directories, files = scan_template(template_path)
+        meta_file = next(
+            (
+                f"{template_path}/{meta_file}"
+                for meta_file in TEMPLATE_META_FILES
+                if os.path.exists(f"{template_path}/{meta_file}")
+            ),
+            None,
+        )
+        meta_mtime = os.stat(meta_file).st_mtime_ns if meta_file else 0
+        template_meta = try_load_template_meta(template_path)
+        if template_meta is None:
+            console.print(
+                f"[red]Invalid template meta file: [cyan]{meta_file}[/cyan][/red]"
+            )
+            raise SystemExit()
+
+        entry = RegistryEntry(
+            name=name,
+            path=template_path,
+            meta_file=meta_file,
+            meta_mtime=meta_mtime,
+            directories=directories,
+            meta=template_meta,
+            files=files,
+        )
+        self.entries[name] = entry
+        self.save()
+        return entry
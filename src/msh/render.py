@@ -1,44 +1,378 @@
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
 import chevron
-from .msh_constants import TEMPLATE_META_FILES
+from .msh_constants import (
+    TEMPLATE_META_FILES,
+    TEMPLATE_INDEX_FILE,
+    TEMPLATE_PARTIALS_DIR,
+    RENDER_CONCURRENCY_MODES,
+)
+from . import profiling
+from .template_cache import Tokens, template_cache
+from .partials import Partials, load_partials, partials_digest
+from .stream_render import iter_rendered_chunks, stream_render_file
+from .sinks import FileSystemSink, MemorySink, OutputSink
+from .writer import FILE_MODE, fsync_path
+
+if TYPE_CHECKING:
+    from .render_cache import RenderCache
+    from .template_index import TemplateIndex
+
+
+def is_template_file(filename: str) -> bool:
+    """Exclude template_meta.[yaml|yml] and variable index files."""
+    return filename not in TEMPLATE_META_FILES and filename != TEMPLATE_INDEX_FILE
 
 
 def walk_files(directory: str) -> List[str]:
-    """Walk through all directories and subdirectories."""
+    """
+    Walk through all directories and subdirectories, except the partials
+    directory of the template.
+    """
     files = []
-    for root, _, filenames in os.walk(directory):
+    for root, dirnames, filenames in os.walk(directory):
+        if root == directory and TEMPLATE_PARTIALS_DIR in dirnames:
+            dirnames.remove(TEMPLATE_PARTIALS_DIR)
         for filename in filenames:
-            # Exclude template_meta.[yaml|yml] files
-            if filename not in TEMPLATE_META_FILES:
+            if is_template_file(filename):
                 files.append(os.path.join(root, filename))
-    return files
+    return sorted(files)
+
+
+class RenderError(Exception):
+    """One or more template files failed to render, in template file order."""
+
+    def __init__(self, errors: List[Tuple[str, Exception]]):
+        self.errors = errors
+        super().__init__(
+            "\n".join(f"{file_path}: {error}" for file_path, error in errors)
+        )
 
 
 def render_path(path: str, metas: dict) -> str:
     """Render the given path with the provided metas."""
-    return chevron.render(path, metas)
+    return chevron.render(template_cache.compile(path), metas)
 
 
-def render_file(file_path: str, metas: dict) -> str:
+def render_tokens(
+    tokens: Tokens, metas: dict, partials: Optional[Partials] = None
+) -> str:
+    """Render parsed tokens, looking partials up only in `partials`."""
+    return chevron.render(
+        tokens, metas, partials_path=None, partials_dict=partials or {}
+    )
+
+
+def render_file(
+    file_path: str, metas: dict, partials: Optional[Partials] = None
+) -> str:
     """Render the content of the file with the provided metas."""
-    with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
-    return chevron.render(content, metas)
+    return render_tokens(template_cache.compile_file(file_path), metas, partials)
+
+
+def copy_file(file_path: str, output_file_path: str):
+    """Copy a file without rendering it, using a kernel copy where available."""
+    shutil.copyfile(file_path, output_file_path)
+    shutil.copymode(file_path, output_file_path)
+
+
+def load_template_files(
+    template_path: str,
+    index: Optional["TemplateIndex"] = None,
+    file_paths: Optional[List[str]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Read every template file once, keyed by its path, walking the template
+    tree unless the `file_paths` are known.
+    Binary files, and with the variable `index` files without tags or large
+    enough to be streamed, are not loaded; their value is None.
+    """
+    files = {}
+    for file_path in (
+        file_paths if file_paths is not None else walk_files(template_path)
+    ):
+        if index is not None and (
+            not index.has_tags(template_path, file_path)
+            or index.can_stream(template_path, file_path)
+        ):
+            files[file_path] = None
+            continue
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                files[file_path] = file.read()
+        except UnicodeDecodeError:
+            files[file_path] = None
+    return files
+
+
+def template_index_for(
+    template_path: str,
+    index: Optional["TemplateIndex"],
+    files: Optional[Dict[str, Optional[str]]] = None,
+) -> "TemplateIndex":
+    """The given variable index, or the one of the template files."""
+    if index is not None:
+        return index
+    from .template_index import load_template_index
+
+    return load_template_index(
+        template_path, file_paths=list(files) if files is not None else None
+    )
+
+
+def render_to_memory(
+    template_path: str,
+    metas: dict,
+    index: Optional["TemplateIndex"] = None,
+) -> Dict[str, bytes]:
+    """
+    Render templates in memory.
+
+    :return: rendered content keyed by output path relative to the template root
+    """
+    sink = MemorySink()
+    render_to_sink(template_path, metas, sink, index=index)
+    return sink.files
+
+
+def rendered_bytes(
+    file_path: str,
+    metas: dict,
+    content: Optional[str],
+    has_tags: bool,
+    stream: bool,
+    partials: Optional[Partials] = None,
+) -> Iterator[bytes]:
+    """The bytes `render_output_file` would write, in chunks."""
+    if not has_tags:
+        with open(file_path, "rb") as file:
+            while chunk := file.read(1024 * 1024):
+                yield chunk
+        return
+    if stream:
+        chunks = iter_rendered_chunks(file_path, metas)
+    elif content is not None:
+        chunks = iter([render_tokens(template_cache.compile(content), metas, partials)])
+    else:
+        chunks = iter([render_file(file_path, metas, partials)])
+    for chunk in chunks:
+        # Text mode writes translate newlines
+        yield chunk.replace("\n", os.linesep).encode("utf-8")
+
+
+def render_to_sink(
+    template_path: str,
+    metas: dict,
+    sink: OutputSink,
+    files: Optional[Dict[str, Optional[str]]] = None,
+    index: Optional["TemplateIndex"] = None,
+    prefix: str = "",
+) -> List[str]:
+    """
+    Render templates straight into `sink`, one file after another in template
+    order, without writing them to disk first. Output paths are relative to
+    the template root, under `prefix` if given. `files` and `index` are used
+    as by `render_template`; large files reach the sink chunk by chunk.
+
+    :return: output paths given to the sink
+    :raises RenderError: for the first file that failed to render
+    """
+    output_paths = []
+    partials = load_partials(template_path)
+    index = template_index_for(template_path, index, files)
+    for file_path in files if files is not None else walk_files(template_path):
+        rendered_path = render_path(file_path, metas)
+        output_path = Path(
+            prefix, os.path.relpath(rendered_path, template_path)
+        ).as_posix()
+        has_tags = index.has_tags(template_path, file_path)
+        try:
+            with profiling.span(file_path, "file"):
+                sink.write(
+                    output_path,
+                    rendered_bytes(
+                        file_path,
+                        metas,
+                        files[file_path] if files is not None else None,
+                        has_tags,
+                        index.can_stream(template_path, file_path),
+                        partials,
+                    ),
+                    # Copied files keep their mode, like `copy_file`
+                    FILE_MODE if has_tags else os.stat(file_path).st_mode & 0o777,
+                )
+        except Exception as e:
+            # The sink cannot take back what it received, stop at the first error
+            raise RenderError([(file_path, e)]) from e
+        output_paths.append(output_path)
+    return output_paths
+
+
+def render_bytes(
+    file_path: str,
+    metas: dict,
+    has_tags: bool = True,
+    partials: Optional[Partials] = None,
+) -> bytes:
+    """Render one template file in memory, files without tags are read as is."""
+    return b"".join(rendered_bytes(file_path, metas, None, has_tags, False, partials))
+
+
+def render_output_file(
+    file_path: str,
+    output_file_path: str,
+    metas: dict,
+    content: Optional[str] = None,
+    has_tags: bool = True,
+    stream: bool = False,
+    fsync: bool = False,
+    partials: Optional[Partials] = None,
+) -> str:
+    """
+    Render one template file into `output_file_path`, whose directory must exist.
+    Binary files and files without tags are copied as they are, large files
+    are rendered chunk by chunk when `stream` is set. With `fsync` the file
+    is flushed to disk before returning. `{{> name}}` tags render the parsed
+    `partials`.
+    """
+    with profiling.span(file_path, "file") as args:
+        if not has_tags:
+            copy_file(file_path, output_file_path)
+        elif stream:
+            stream_render_file(file_path, output_file_path, metas)
+        else:
+            if content is not None:
+                tokens = template_cache.compile(content)
+            else:
+                tokens = template_cache.compile_file(file_path)
+            rendered_content = render_tokens(tokens, metas, partials)
+            with open(output_file_path, "w", encoding="utf-8") as output_file:
+                output_file.write(rendered_content)
+        if fsync:
+            fsync_path(output_file_path)
+        if args is not None:
+            args["bytes_read"] = os.path.getsize(file_path)
+            args["bytes_written"] = os.path.getsize(output_file_path)
+    return output_file_path
+
+
+def run_jobs(
+    func: Callable[..., Any],
+    jobs: List[tuple],
+    concurrency: str = "serial",
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """
+    Run `func(*job)` for every job, serially or fanned out to a thread or
+    process pool. Results come back in job order; failures are collected
+    (keyed by the first job argument) and raised together as `RenderError`.
+    """
+    if concurrency not in RENDER_CONCURRENCY_MODES:
+        raise ValueError(
+            f"Unknown concurrency mode: {concurrency}, expected one of {', '.join(RENDER_CONCURRENCY_MODES)}"
+        )
+
+    results: List[Any] = []
+    errors: List[Tuple[str, Exception]] = []
+    if concurrency == "serial" or len(jobs) <= 1:
+        for job in jobs:
+            try:
+                results.append(func(*job))
+            except Exception as e:
+                errors.append((job[0], e))
+    else:
+        executor_class = (
+            ThreadPoolExecutor if concurrency == "thread" else ProcessPoolExecutor
+        )
+        with executor_class(max_workers=max_workers) as executor:
+            futures = [executor.submit(func, *job) for job in jobs]
+            for job, future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append((job[0], e))
+
+    if errors:
+        raise RenderError(errors) from errors[0][1]
+    return results
 
 
 def render_template(
     template_path: str,
     output_path: str,
     metas: dict,
-) -> str:
-    """Render templates with the provided metas."""
-    files = walk_files(template_path)
-    for file_path in files:
-        rendered_path = render_path(file_path, metas)
-        rendered_output_path = rendered_path.replace(template_path, output_path)
-        rendered_content = render_file(file_path, metas)
-        Path(rendered_output_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(rendered_output_path, "w", encoding="utf-8") as output_file:
-            output_file.write(rendered_content)
+    files: Optional[Dict[str, Optional[str]]] = None,
+    concurrency: str = "serial",
+    max_workers: Optional[int] = None,
+    index: Optional["TemplateIndex"] = None,
+    fsync: str = "none",
+    cache: Optional["RenderCache"] = None,
+) -> List[str]:
+    """
+    Render templates with the provided metas.
+    `files` may hold the contents preloaded by `load_template_files`, so that
+    rendering the same template many times does not read it again.
+    `concurrency` is one of `serial`, `thread` (I/O bound templates) or
+    `process` (CPU bound rendering), with `max_workers` workers.
+    Binary files and files without tags are copied instead of rendered, and
+    files over `STREAM_RENDER_THRESHOLD` bytes are streamed with bounded
+    memory, as told by the variable `index` of the template, loaded with
+    `load_template_index` when not given.
+    Partials are loaded once per call, see `load_partials`.
+    Files are written through a `FileSystemSink`, to a staging directory
+    moved into `output_path` only once all of them rendered, see
+    `OutputWriter` for the `fsync` policies.
+    With a `cache`, rendered files are taken from it when they were rendered
+    before from the same content and metas, see `RenderCache`.
+
+    :return: rendered output file paths, in template file order
+    :raises RenderError: if any file failed to render, leaving
+        `output_path` untouched
+    """
+    output_file_paths = []
+    jobs = []
+    partials = load_partials(template_path)
+    partials_hash = partials_digest(partials) if cache is not None else ""
+    index = template_index_for(template_path, index, files)
+    with FileSystemSink(output_path, fsync) as sink:
+        for file_path in files if files is not None else walk_files(template_path):
+            rendered_path = render_path(file_path, metas)
+            rendered_output_path = rendered_path.replace(template_path, output_path)
+            content = files[file_path] if files is not None else None
+            has_tags = index.has_tags(template_path, file_path)
+            stream = index.can_stream(template_path, file_path)
+            output_file_paths.append(rendered_output_path)
+            jobs.append(
+                (
+                    file_path,
+                    sink.staged(rendered_output_path),
+                    metas,
+                    content,
+                    has_tags,
+                    stream,
+                    fsync == "per-file",
+                    partials,
+                )
+            )
+            if cache is not None:
+                jobs[-1] += (
+                    index.file_variables(template_path, file_path),
+                    partials_hash,
+                )
+
+        # 一次性创建所有输出目录，避免每个文件重复 mkdir
+        with profiling.span("mkdir"):
+            sink.make_directories(
+                os.path.dirname(output_file_path)
+                for output_file_path in output_file_paths
+            )
+
+        with profiling.span("render", files=len(jobs)):
+            if cache is not None:
+                cache.count(run_jobs(cache.render_file, jobs, concurrency, max_workers))
+            else:
+                run_jobs(render_output_file, jobs, concurrency, max_workers)
+    return output_file_paths
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import shutil
+from typing import Iterable, Optional
+from pydantic import BaseModel
+
+from .incremental import hash_template, metas_hash
+from .msh_constants import RENDER_CACHE_MAX_SIZE, RENDER_CACHE_PATH
+from .partials import Partials
+from .render import render_output_file
+from .version import package_version
+from .writer import fsync_path
+
+
+class RenderCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evicted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class RenderCache:
+    """
+    Rendered files stored on disk under the hash of what they were rendered
+    from: the template file content, the metas it references, the partials
+    it may include and the msh version. The directory holds nothing else,
+    so it can be shared between runs or saved and restored by CI.
+
+    A hit copies the stored file to the output, or hard links it with `link`;
+    linked files share the read-only stored file. Files are evicted least
+    recently used first once the cache grows over `max_size` bytes, see
+    `prune`.
+    """
+
+    def __init__(
+        self,
+        path: str = RENDER_CACHE_PATH,
+        max_size: int = RENDER_CACHE_MAX_SIZE,
+        link: bool = False,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.link = link
+        self.version = package_version()
+        self.stats = RenderCacheStats()
+        os.makedirs(path, exist_ok=True)
+
+    def key(
+        self,
+        template_hash: str,
+        metas: dict,
+        names: Optional[set],
+        partials_hash: str,
+    ) -> str:
+        """
+        `template_hash` is the `hash_template` of the file, `names` are the
+        metas it references, None when unknown.
+        """
+        key = hashlib.sha256()
+        key.update(self.version.encode("utf-8") + b"\0")
+        key.update(template_hash.encode("utf-8"))
+        key.update(metas_hash(metas, names).encode("utf-8"))
+        if names is None:
+            # Files that may include partials
+            key.update(partials_hash.encode("utf-8"))
+        # Rendered text is written with the platform newlines
+        key.update(os.linesep.encode("utf-8"))
+        return key.hexdigest()
+
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def fetch(self, key: str, output_file_path: str) -> bool:
+        """Put the stored file at `output_file_path`, False on a miss."""
+        blob_path = self.blob_path(key)
+        try:
+            if self.link:
+                try:
+                    os.link(blob_path, output_file_path)
+                except FileExistsError:
+                    os.remove(output_file_path)
+                    os.link(blob_path, output_file_path)
+            else:
+                shutil.copyfile(blob_path, output_file_path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            if not self.link:
+                raise
+            # Across file systems, fall back to a copy
+            shutil.copyfile(blob_path, output_file_path)
+        # Mark it recently used for the eviction, a read-only cache is fine
+        try:
+            os.utime(blob_path)
+        except OSError:
+            pass
+        return True
+
+    def store(self, key: str, output_file_path: str):
+        """Store a rendered file, atomically so concurrent runs can share the cache."""
+        blob_path = self.blob_path(key)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        temp_path = f"{blob_path}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(output_file_path, temp_path)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, blob_path)
+        except OSError:
+            # The cache is an optimization, a read-only cache is fine
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def render_file(
+        self,
+        file_path: str,
+        output_file_path: str,
+        metas: dict,
+        content: Optional[str] = None,
+        has_tags: bool = True,
+        stream: bool = False,
+        fsync: bool = False,
+        partials: Optional[Partials] = None,
+        names: Optional[set] = None,
+        partials_hash: str = "",
+    ) -> Optional[str]:
+        """
+        `render_output_file` through the cache.
+
+        :return: `hit` or `miss`, None for files copied without rendering
+        """
+        if not has_tags:
+            render_output_file(
+                file_path, output_file_path, metas, content, has_tags, stream, fsync
+            )
+            return None
+
+        template_hash = hash_template(file_path, content, has_tags)
+        key = self.key(template_hash, metas, names, partials_hash)
+        if self.fetch(key, output_file_path):
+            if fsync:
+                fsync_path(output_file_path)
+            return "hit"
+        render_output_file(
+            file_path,
+            output_file_path,
+            metas,
+            content,
+            has_tags,
+            stream,
+            fsync,
+            partials,
+        )
+        self.store(key, output_file_path)
+        return "miss"
+
+    def count(self, statuses: Iterable[Optional[str]]):
+        """Add the results of `render_file` jobs, which may run in other processes."""
+        for status in statuses:
+            if status == "hit":
+                self.stats.hits += 1
+            elif status == "miss":
+                self.stats.misses += 1
+
+    def prune(self) -> int:
+        """Evict least recently used files until the cache fits `max_size`."""
+        blobs = []
+        total = 0
+        for root, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                blob_path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(blob_path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime_ns, stat.st_size, blob_path))
+                total += stat.st_size
+
+        evicted = 0
+        for _, size, blob_path in sorted(blobs):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(blob_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self.stats.evicted += evicted
+        return evicted
@@ -0,0 +1,314 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field, ValidationError
+from rich.console import Console
+
+from .types import TemplateMeta
+from .load_meta import try_load_template_meta, resolve_metas, answer_from_values
+from .render import RenderError, render_template, render_to_memory
+from .incremental import render_template_incremental
+from .sinks import encode_content
+from .template_index import TemplateIndex, load_template_index
+from .msh_constants import (
+    DEFAULT_TEMPLATES_PATH,
+    SERVER_REVALIDATE_INTERVAL,
+    TEMPLATE_META_FILES,
+)
+
+
+console = Console()
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(message)
+
+
+class RenderRequest(BaseModel):
+    template: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    output: Optional[str] = None
+    incremental: bool = False
+
+
+class LoadedTemplate(BaseModel):
+    path: str
+    meta: TemplateMeta
+    meta_mtime: int
+    index: TemplateIndex
+    # time.monotonic() of the last check against the files
+    checked: float = 0.0
+
+
+class TemplateStore:
+    """
+    Templates kept loaded across requests. The meta is loaded again only when
+    its file changes, the variable index is refreshed in memory; both are
+    checked at most once every `revalidate_interval` seconds per template,
+    so requests for different templates, or within the interval, do not
+    wait on each other. Compiled templates and convertors stay in their
+    process-wide caches.
+    """
+
+    def __init__(
+        self,
+        templates_path: str = DEFAULT_TEMPLATES_PATH,
+        revalidate_interval: float = SERVER_REVALIDATE_INTERVAL,
+    ):
+        self.templates_path = templates_path
+        self.revalidate_interval = revalidate_interval
+        self._templates: Dict[str, LoadedTemplate] = {}
+        self._template_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return sorted(
+            name
+            for name in os.listdir(self.templates_path)
+            if os.path.isdir(os.path.join(self.templates_path, name))
+        )
+
+    def get(self, name: str) -> LoadedTemplate:
+        loaded = self._templates.get(name)
+        if (
+            loaded is not None
+            and time.monotonic() - loaded.checked < self.revalidate_interval
+        ):
+            return loaded
+
+        if name not in self.names():
+            raise RequestError(404, f"Template '{name}' not found.")
+        with self._lock:
+            template_lock = self._template_locks.setdefault(name, threading.Lock())
+        # Only requests for the same template wait for its files to be checked
+        with template_lock:
+            return self.revalidate(name)
+
+    def revalidate(self, name: str) -> LoadedTemplate:
+        loaded = self._templates.get(name)
+        if (
+            loaded is not None
+            and time.monotonic() - loaded.checked < self.revalidate_interval
+        ):
+            # Checked by the request holding the lock before
+            return loaded
+
+        template_path = f"{self.templates_path}/{name}"
+        meta_mtime = None
+        for meta_file in TEMPLATE_META_FILES:
+            file_path = os.path.join(template_path, meta_file)
+            if os.path.exists(file_path):
+                meta_mtime = os.stat(file_path).st_mtime_ns
+                break
+        if meta_mtime is None:
+            raise RequestError(404, f"Template meta file not found for '{name}'.")
+
+        checked = time.monotonic()
+        if loaded is None or loaded.meta_mtime != meta_mtime:
+            try:
+                template_meta = try_load_template_meta(template_path)
+            except SystemExit:
+                template_meta = None
+            if template_meta is None:
+                raise RequestError(500, f"Invalid template meta for '{name}'.")
+            loaded = LoadedTemplate(
+                path=template_path,
+                meta=template_meta,
+                meta_mtime=meta_mtime,
+                index=load_template_index(template_path),
+                checked=checked,
+            )
+        else:
+            loaded = loaded.model_copy(
+                update={
+                    "index": load_template_index(template_path, loaded.index),
+                    "checked": checked,
+                }
+            )
+        self._templates[name] = loaded
+        return loaded
+
+
+def resolve_output(output_root: Optional[str], output: str) -> str:
+    """
+    Directory of a request `output`, relative to the `output_root` the
+    server may write into; without one, directory output is disabled.
+    """
+    if output_root is None:
+        raise RequestError(
+            403, "Directory output is disabled, start the server with --output-root."
+        )
+    root = os.path.realpath(output_root)
+    output_path = os.path.realpath(os.path.join(root, output))
+    if os.path.commonpath([root, output_path]) != root:
+        raise RequestError(403, f"Output '{output}' is outside the output root.")
+    return output_path
+
+
+def render_request(
+    store: TemplateStore, request: RenderRequest, output_root: Optional[str] = None
+) -> dict:
+    if request.incremental and request.output is None:
+        raise RequestError(400, "An incremental render needs an output.")
+    output_path = (
+        resolve_output(output_root, request.output)
+        if request.output is not None
+        else None
+    )
+    loaded = store.get(request.template)
+    try:
+        metas = resolve_metas(
+            loaded.meta, answer_from_values(request.params), loaded.index.references()
+        )
+    except SystemExit:
+        raise RequestError(400, "Invalid parameters, see the server log.")
+
+    try:
+        if output_path is None:
+            outputs = render_to_memory(loaded.path, metas, loaded.index)
+            files = [
+                {"path": path, **encode_content(content)}
+                for path, content in outputs.items()
+            ]
+            return {"metas": metas, "files": files}
+
+        if request.incremental:
+            result = render_template_incremental(
+                loaded.path, output_path, metas, index=loaded.index
+            )
+            return {"metas": metas, "output": output_path, **result.model_dump()}
+
+        written = render_template(loaded.path, output_path, metas, index=loaded.index)
+        return {"metas": metas, "output": output_path, "files": written}
+    except RenderError as e:
+        raise RequestError(
+            500,
+            "; ".join(f"{file_path}: {error}" for file_path, error in e.errors),
+        )
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /templates  list the available templates
+    POST /render     {"template", "params", "output"?, "incremental"?}
+                     renders into `output` under the output root of the
+                     server, or returns the files when omitted
+
+    Render requests must be JSON and same-origin, so that web pages cannot
+    post them to a local server.
+    """
+
+    server_version = "msh"
+
+    def do_GET(self):
+        if self.path == "/templates":
+            self.send_json(200, {"templates": self.server.store.names()})
+        else:
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            self.check_request()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                raise RequestError(400, "Invalid Content-Length header.")
+            request = RenderRequest.model_validate_json(self.rfile.read(length))
+            self.send_json(
+                200,
+                render_request(self.server.store, request, self.server.output_root),
+            )
+        except ValidationError as e:
+            self.send_json(400, {"error": str(e)})
+        except RequestError as e:
+            self.send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            # Unexpected errors, e.g. writing the output, still get an answer
+            console.print(f"[red]Render request failed: {e!r}[/red]")
+            self.send_json(500, {"error": str(e) or type(e).__name__})
+
+    def check_request(self):
+        """Reject the requests a browser sends cross-origin without a preflight."""
+        if self.headers.get_content_type() != "application/json":
+            raise RequestError(415, "Content-Type must be application/json.")
+        origin = self.headers.get("Origin")
+        if origin is not None and origin != f"http://{self.headers.get('Host')}":
+            raise RequestError(403, f"Cross-origin request from {origin} rejected.")
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Unix socket clients have no address
+        console.print(f"[blue]$[/blue] {format % args}")
+
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address, store: TemplateStore, output_root: Optional[str] = None
+    ):
+        self.store = store
+        self.output_root = output_root
+        super().__init__(address, RenderRequestHandler)
+
+
+class UnixRenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path: str, store: TemplateStore, output_root: Optional[str] = None
+    ):
+        self.store = store
+        self.output_root = output_root
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, RenderRequestHandler)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    templates_path: str = DEFAULT_TEMPLATES_PATH,
+    output_root: Optional[str] = None,
+):
+    """
+    Serve render requests until interrupted, with warm template caches.
+    Requests may render into directories under `output_root` only, and
+    without it only get the rendered files back.
+    """
+    store = TemplateStore(templates_path)
+    if socket_path:
+        server = UnixRenderServer(socket_path, store, output_root)
+        address = socket_path
+    else:
+        server = RenderServer((host, port), store, output_root)
+        address = f"http://{host}:{server.server_address[1]}"
+
+    console.print(
+        f"[cyan]Serving templates from [magenta]{templates_path}[/magenta] on [magenta]{address}[/magenta][/cyan]"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("[red]Server stopped.[/red]")
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,231 @@
+import base64
+import json
+import os
+import stat
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from .msh_constants import OUTPUT_SINKS, STREAM_RENDER_THRESHOLD
+from .writer import OutputWriter, fsync_path
+
+
+class OutputSink:
+    """
+    Receives rendered files, keyed by their POSIX path relative to the output
+    root. Used as a context manager, the output is completed when the block
+    succeeds and abandoned when it raises.
+    """
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class FileSystemSink(OutputSink):
+    """
+    Files under an output directory, staged by an `OutputWriter` and moved
+    into place when the sink is closed. Renderers writing the files
+    themselves, from a worker pool, as copies or from the render cache,
+    write each one to its `staged` path instead of through `write`.
+    """
+
+    def __init__(self, output_path: str, fsync: str = "none"):
+        self.output_path = output_path
+        self.fsync = fsync
+        self.writer = OutputWriter(output_path, fsync)
+
+    def __enter__(self) -> "FileSystemSink":
+        self.writer.__enter__()
+        return self
+
+    def staged(self, output_file_path: str) -> str:
+        """Where to write an output file, see `OutputWriter.staged`."""
+        return self.writer.staged(output_file_path)
+
+    def make_directories(self, directories: Iterable[str]):
+        self.writer.make_directories(directories)
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        staged_path = self.staged(os.path.join(self.writer.output_path, path))
+        os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+        with open(staged_path, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.chmod(staged_path, mode)
+        if self.fsync == "per-file":
+            fsync_path(staged_path)
+
+    def close(self):
+        self.writer.commit()
+
+    def abort(self):
+        self.writer.abort()
+
+
+class MemorySink(OutputSink):
+    """Files kept in memory, in `files`."""
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        self.files[path] = b"".join(chunks)
+
+
+class StreamSink(OutputSink):
+    """
+    A sink writing to a file object. A file opened from a path is closed with
+    the sink, and removed if the sink is abandoned.
+    """
+
+    def __init__(self, file: BinaryIO, path: Optional[str] = None):
+        self.file = file
+        self.path = path
+
+    def close(self):
+        if self.path is not None:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def abort(self):
+        if self.path is not None:
+            self.file.close()
+            os.remove(self.path)
+
+
+class ZipSink(StreamSink):
+    """
+    A zip archive. Entries are compressed as they are rendered, the file
+    object does not need to be seekable.
+    """
+
+    def __init__(self, file: BinaryIO, path: Optional[str] = None):
+        super().__init__(file, path)
+        self.archive = zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED)
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        info = zipfile.ZipInfo(path, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = (stat.S_IFREG | mode) << 16
+        # The size is unknown until the file is rendered
+        with self.archive.open(info, "w", force_zip64=True) as entry:
+            for chunk in chunks:
+                entry.write(chunk)
+
+    def close(self):
+        self.archive.close()
+        super().close()
+
+    def abort(self):
+        # Written to stdout, the partial archive is left to the exit status
+        self.archive.close()
+        super().abort()
+
+
+class TarSink(StreamSink):
+    """
+    A tar archive, gzip compressed with `compression="gz"`, written as a
+    stream. Tar headers come before the content, so each file is held until
+    it is rendered; only files over `STREAM_RENDER_THRESHOLD` spill to a
+    temporary file.
+    """
+
+    def __init__(
+        self, file: BinaryIO, path: Optional[str] = None, compression: str = ""
+    ):
+        super().__init__(file, path)
+        self.archive = tarfile.open(fileobj=file, mode=f"w|{compression}")
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_RENDER_THRESHOLD) as data:
+            for chunk in chunks:
+                data.write(chunk)
+            info = tarfile.TarInfo(path)
+            info.size = data.tell()
+            info.mode = mode
+            info.mtime = int(time.time())
+            data.seek(0)
+            self.archive.addfile(info, data)
+
+    def close(self):
+        self.archive.close()
+        super().close()
+
+    def abort(self):
+        # Written to stdout, the partial archive is left to the exit status
+        self.archive.close()
+        super().abort()
+
+
+def encode_content(content: bytes) -> dict:
+    """File content for a JSON document, as text or base64 if binary."""
+    try:
+        return {"encoding": "utf-8", "content": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {
+            "encoding": "base64",
+            "content": base64.b64encode(content).decode("ascii"),
+        }
+
+
+class JsonLinesSink(StreamSink):
+    """One JSON object per file and line: `path`, `mode`, `encoding`, `content`."""
+
+    def write(self, path: str, chunks: Iterable[bytes], mode: int):
+        line = json.dumps(
+            {"path": path, "mode": mode, **encode_content(b"".join(chunks))},
+            ensure_ascii=False,
+        )
+        self.file.write(line.encode("utf-8") + b"\n")
+
+
+def parse_sink(spec: str) -> Tuple[str, str]:
+    """
+    Split a `--sink FORMAT[:PATH]` value, the path defaults to `-` (stdout).
+
+    :raises ValueError: if the format is unknown
+    """
+    sink_format, _, path = spec.partition(":")
+    if sink_format not in OUTPUT_SINKS:
+        raise ValueError(
+            f"Unknown sink: {sink_format}, expected one of {', '.join(OUTPUT_SINKS)}"
+        )
+    return sink_format, path or "-"
+
+
+def open_sink(spec: str) -> OutputSink:
+    """Open the sink of a `--sink FORMAT[:PATH]` value."""
+    sink_format, path = parse_sink(spec)
+    if path == "-":
+        file, owned_path = sys.stdout.buffer, None
+    else:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        file, owned_path = open(path, "wb"), path
+
+    if sink_format == "zip":
+        return ZipSink(file, owned_path)
+    if sink_format == "tar":
+        return TarSink(file, owned_path)
+    if sink_format == "tar.gz":
+        return TarSink(file, owned_path, compression="gz")
+    return JsonLinesSink(file, owned_path)
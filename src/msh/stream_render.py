@@ -0,0 +1,105 @@
+from typing import Iterator, List, TextIO, Tuple
+import chevron
+from chevron import ChevronError
+from chevron.tokenizer import tokenize
+from rich.console import Console
+
+from .msh_constants import STREAM_CHUNK_SIZE, STREAM_MAX_CHUNK_SIZE
+
+
+console = Console()
+
+
+def delimiters_after(tokens: List[Tuple[str, str]], l_del: str, r_del: str):
+    """Delimiters in effect after the tokens, following `{{=<% %>=}}` tags."""
+    for tag, key in tokens:
+        if tag == "set delimiter":
+            delimiters = key.strip().split(" ")
+            l_del, r_del = delimiters[0], delimiters[-1]
+    return l_del, r_del
+
+
+def iter_token_chunks(
+    file: TextIO,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    max_chunk_size: int = STREAM_MAX_CHUNK_SIZE,
+) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Tokenize a template file chunk by chunk.
+
+    Chunks end on a line boundary and only once every section opened in them
+    is closed; mustache standalone lines are decided within a line, so
+    rendering the chunks one after another gives the same output as
+    rendering the whole file at once. Delimiters set by `{{= =}}` carry over
+    to the next chunk.
+
+    A chunk that cannot end before `max_chunk_size` characters, within a
+    very long line or a section spanning most of the file, keeps growing
+    until it can, with a warning: memory is then no longer bounded by the
+    chunk size.
+    """
+    l_del, r_del = "{{", "}}"
+    buffer: List[str] = []
+    buffer_size = 0
+    attempt_size = chunk_size
+    warned = False
+    # Lines are read in pieces, so a very long line is noticed as it grows
+    for piece in iter(lambda: file.readline(chunk_size), ""):
+        buffer.append(piece)
+        buffer_size += len(piece)
+        if buffer_size >= max_chunk_size and not warned:
+            console.print(
+                f"[yellow]Streaming {getattr(file, 'name', 'a template')}: "
+                f"a line or section spans over {max_chunk_size} characters, "
+                "it is rendered in memory.[/yellow]"
+            )
+            warned = True
+        if buffer_size < attempt_size or not piece.endswith("\n"):
+            continue
+
+        try:
+            tokens = list(tokenize("".join(buffer), l_del, r_del))
+        except ChevronError:
+            # A section or tag is still open, try again with twice as much
+            attempt_size = buffer_size * 2
+            continue
+        yield tokens
+        l_del, r_del = delimiters_after(tokens, l_del, r_del)
+        buffer = []
+        buffer_size = 0
+        attempt_size = chunk_size
+        warned = False
+
+    if buffer:
+        yield list(tokenize("".join(buffer), l_del, r_del))
+
+
+def stream_render_file(
+    file_path: str,
+    output_file_path: str,
+    metas: dict,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> str:
+    """
+    Render a template file chunk by chunk, writing each rendered chunk as it
+    goes, so memory stays bounded by the chunk size instead of the file size.
+    Partials are not supported: their indentation depends on output rendered
+    before the chunk.
+    """
+    with open(output_file_path, "w", encoding="utf-8") as output_file:
+        for rendered in iter_rendered_chunks(file_path, metas, chunk_size):
+            output_file.write(rendered)
+    return output_file_path
+
+
+def iter_rendered_chunks(
+    file_path: str, metas: dict, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Render a template file chunk by chunk, yielding the rendered text.
+    Partials are not streamed: files including them are rendered whole,
+    see `TemplateIndex.can_stream`.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        for tokens in iter_token_chunks(file, chunk_size):
+            yield chevron.render(tokens, metas)
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Set, Tuple
+from chevron.tokenizer import tokenize
+
+from .msh_constants import TEMPLATE_CACHE_SIZE
+
+Tokens = Tuple[Tuple[str, str], ...]
+
+# Tags whose key is looked up in the render data
+KEY_TAGS = ("variable", "no escape", "section", "inverted section")
+
+
+class TemplateCache:
+    """
+    Tokenized Mustache templates with LRU eviction.
+
+    File bodies are keyed by path + mtime + size so an edited file is parsed
+    again, in-memory sources (path patterns, preloaded bodies) by their
+    content hash. `chevron.render` accepts the token stream in place of the
+    source, so rendering from the cache gives the same output.
+    """
+
+    def __init__(self, max_size: int = TEMPLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tokens]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, source: str) -> Tokens:
+        """Tokenize a template source, reusing a previous parse of the same content."""
+        key = ("source", hashlib.blake2b(source.encode("utf-8")).digest())
+        tokens = self._get(key)
+        if tokens is None:
+            tokens = tuple(tokenize(source))
+            self._put(key, tokens)
+        return tokens
+
+    def compile_file(self, file_path: str) -> Tokens:
+        """Tokenize a template file, parsing it again only when it changed on disk."""
+        stat = os.stat(file_path)
+        key = ("file", file_path, stat.st_mtime_ns, stat.st_size)
+        tokens = self._get(key)
+        if tokens is None:
+            with open(file_path, "r", encoding="utf-8") as file:
+                tokens = tuple(tokenize(file.read()))
+            self._put(key, tokens)
+        return tokens
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: Hashable) -> Optional[Tokens]:
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is not None:
+                self._entries.move_to_end(key)
+            return tokens
+
+    def _put(self, key: Hashable, tokens: Tokens):
+        with self._lock:
+            self._entries[key] = tokens
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+template_cache = TemplateCache()
+
+
+def token_names(tokens: Tokens) -> Optional[Set[str]]:
+    """
+    Top-level data keys referenced by the tokens (`{{a.b}}` references `a`).
+    Returns None if the tokens include a partial, whose references are unknown.
+    """
+    names: Set[str] = set()
+    for tag, key in tokens:
+        if tag == "partial":
+            return None
+        if tag in KEY_TAGS and key != ".":
+            names.add(key.split(".", 1)[0])
+    return names
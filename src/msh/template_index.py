@@ -0,0 +1,235 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from chevron import ChevronError
+from pydantic import BaseModel, Field, ValidationError
+
+from .msh_constants import TEMPLATE_INDEX_FILE, STREAM_RENDER_THRESHOLD
+from . import profiling
+from .render import walk_files
+from .stream_render import iter_token_chunks
+from .template_cache import template_cache, token_names
+from .types import TemplateMeta
+
+# A NUL byte near the start marks a binary file
+BINARY_MARKER = b"\0"
+
+
+class IndexedFile(BaseModel):
+    """Variables referenced by one template file, None when unknown (partials)."""
+
+    mtime: int
+    size: int
+    path_names: Optional[List[str]] = None
+    body_names: Optional[List[str]] = None
+    has_tags: bool = True
+    binary: bool = False
+
+    @property
+    def names(self) -> Optional[Set[str]]:
+        if self.path_names is None or self.body_names is None:
+            return None
+        return set(self.path_names) | set(self.body_names)
+
+
+class TemplateIndex(BaseModel):
+    """
+    Variable index of a template tree, keyed by file path relative to the
+    template root.
+    """
+
+    files: Dict[str, IndexedFile] = Field(default_factory=dict)
+
+    def file_variables(self, template_path: str, file_path: str) -> Optional[Set[str]]:
+        """Variables referenced by the path and body of one file."""
+        indexed_file = self.files.get(relative_template_path(template_path, file_path))
+        return indexed_file.names if indexed_file is not None else None
+
+    def has_tags(self, template_path: str, file_path: str) -> bool:
+        indexed_file = self.files.get(relative_template_path(template_path, file_path))
+        return indexed_file is None or indexed_file.has_tags
+
+    def can_stream(
+        self,
+        template_path: str,
+        file_path: str,
+        threshold: int = STREAM_RENDER_THRESHOLD,
+    ) -> bool:
+        """Whether a file is large enough to stream and has no partials."""
+        indexed_file = self.files.get(relative_template_path(template_path, file_path))
+        return (
+            indexed_file is not None
+            and indexed_file.has_tags
+            and indexed_file.body_names is not None
+            and indexed_file.size >= threshold
+        )
+
+    def variable_files(self) -> Dict[str, List[str]]:
+        """Files referencing each variable, in file order."""
+        index: Dict[str, List[str]] = {}
+        for relative_path, indexed_file in self.files.items():
+            for name in sorted(indexed_file.names or ()):
+                index.setdefault(name, []).append(relative_path)
+        return index
+
+    def references(self) -> Optional[Set[str]]:
+        """Variables referenced by the whole template, None when unknown."""
+        references: Set[str] = set()
+        for indexed_file in self.files.values():
+            names = indexed_file.names
+            if names is None:
+                return None
+            references.update(names)
+        return references
+
+
+def relative_template_path(template_path: str, file_path: str) -> str:
+    return Path(os.path.relpath(file_path, template_path)).as_posix()
+
+
+def index_file(relative_path: str, file_path: str, stat: os.stat_result) -> IndexedFile:
+    indexed_file = IndexedFile(mtime=stat.st_mtime_ns, size=stat.st_size)
+    try:
+        path_names = token_names(template_cache.compile(relative_path))
+    except ChevronError:
+        return indexed_file
+    indexed_file.path_names = sorted(path_names) if path_names is not None else None
+
+    if stat.st_size >= STREAM_RENDER_THRESHOLD:
+        return index_large_file(indexed_file, file_path)
+
+    with open(file_path, "rb") as file:
+        data = file.read()
+    try:
+        content = data.decode("utf-8") if BINARY_MARKER not in data[:8192] else None
+    except UnicodeDecodeError:
+        content = None
+    if content is None or "{{" not in content:
+        # Binary files and files without tags are copied as they are
+        indexed_file.binary = content is None
+        indexed_file.body_names = []
+        indexed_file.has_tags = False
+        return indexed_file
+
+    try:
+        tokens = template_cache.compile_file(file_path)
+    except ChevronError:
+        # Leave the variables unknown, rendering reports the error
+        return indexed_file
+    body_names = token_names(tokens)
+    indexed_file.body_names = sorted(body_names) if body_names is not None else None
+    indexed_file.has_tags = any(tag != "literal" for tag, _ in tokens)
+    return indexed_file
+
+
+def index_large_file(indexed_file: IndexedFile, file_path: str) -> IndexedFile:
+    """Index a file chunk by chunk, without caching its tokens."""
+    with open(file_path, "rb") as file:
+        if BINARY_MARKER in file.read(8192):
+            indexed_file.binary = True
+            indexed_file.body_names = []
+            indexed_file.has_tags = False
+            return indexed_file
+
+    body_names: Optional[Set[str]] = set()
+    has_tags = False
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            for tokens in iter_token_chunks(file):
+                names = token_names(tokens)
+                body_names = (
+                    body_names | names
+                    if names is not None and body_names is not None
+                    else None
+                )
+                has_tags = has_tags or any(tag != "literal" for tag, _ in tokens)
+    except UnicodeDecodeError:
+        indexed_file.binary = True
+        indexed_file.body_names = []
+        indexed_file.has_tags = False
+        return indexed_file
+    except ChevronError:
+        return indexed_file
+    indexed_file.body_names = sorted(body_names) if body_names is not None else None
+    indexed_file.has_tags = has_tags
+    return indexed_file
+
+
+def load_template_index(
+    template_path: str,
+    previous: Optional[TemplateIndex] = None,
+    file_paths: Optional[List[str]] = None,
+) -> TemplateIndex:
+    """
+    Load the variable index persisted in the template directory, scanning
+    again only the files whose mtime or size changed, and save it back if
+    anything changed. A `previous` index kept in memory is refreshed the
+    same way without reading the persisted one, and known `file_paths`
+    (from the template registry) save walking the template tree.
+    """
+    with profiling.span("index", path=template_path):
+        return refresh_template_index(template_path, previous, file_paths)
+
+
+def refresh_template_index(
+    template_path: str,
+    previous: Optional[TemplateIndex],
+    file_paths: Optional[List[str]] = None,
+) -> TemplateIndex:
+    index_path = os.path.join(template_path, TEMPLATE_INDEX_FILE)
+    if previous is None:
+        try:
+            with open(index_path, "r", encoding="utf-8") as file:
+                previous = TemplateIndex.model_validate_json(file.read())
+        except (FileNotFoundError, ValidationError):
+            previous = TemplateIndex()
+
+    index = TemplateIndex()
+    if file_paths is None:
+        file_paths = walk_files(template_path)
+    for file_path in file_paths:
+        relative_path = relative_template_path(template_path, file_path)
+        stat = os.stat(file_path)
+        indexed_file = previous.files.get(relative_path)
+        if (
+            indexed_file is None
+            or indexed_file.mtime != stat.st_mtime_ns
+            or indexed_file.size != stat.st_size
+        ):
+            indexed_file = index_file(relative_path, file_path, stat)
+        index.files[relative_path] = indexed_file
+
+    if index != previous:
+        try:
+            with open(index_path, "w", encoding="utf-8") as file:
+                file.write(index.model_dump_json(indent=2))
+        except OSError:
+            # Read-only template libraries still get an in-memory index
+            pass
+    return index
+
+
+def lint_template(
+    template_meta: TemplateMeta, index: TemplateIndex
+) -> Dict[str, List[str]]:
+    """
+    Compare the template meta with the variable index.
+
+    :return: `unused` parameters, referenced by no file and no other parameter,
+        and `undefined` variables, referenced by files but not declared
+    """
+    declared = {param.name for param in template_meta.parameters}
+    variable_files = index.variable_files()
+    depended_on: Set[str] = set()
+    for dependencies in template_meta.graph.dependencies.values():
+        depended_on.update(dependencies)
+
+    unused = []
+    if index.references() is not None:
+        unused = [
+            param.name
+            for param in template_meta.parameters
+            if param.name not in variable_files and param.name not in depended_on
+        ]
+    undefined = sorted(name for name in variable_files if name not in declared)
+    return {"unused": unused, "undefined": undefined}
@@ -1,5 +1,8 @@
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, model_validator
+from typing import Callable, Optional, List, Dict, Any, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from .meta_graph import MetaGraph
+from .InnerExecutor import compile_inner_convertor, compile_inner_convertor_many
 
 
 class Convertor(BaseModel):
@@ -17,6 +20,13 @@ class Parameter(BaseModel):
     innerConvertor: Optional[List[Convertor]] = None
     convertor: Optional[str] = None
 
+    _inner_pipeline: List[Tuple[str, Callable[[str], str]]] = PrivateAttr(
+        default_factory=list
+    )
+    _inner_pipeline_many: List[Tuple[str, Callable[[List[str]], List[str]]]] = (
+        PrivateAttr(default_factory=list)
+    )
+
     @model_validator(mode="after")
     def validate_target_when_ask_false_and_inner_convertor_exist(self):
         if self.innerConvertor and self.ask is False and not self.target:
@@ -25,6 +35,58 @@ class Parameter(BaseModel):
             )
         return self
 
+    @model_validator(mode="after")
+    def compile_inner_convertors(self):
+        # Looked up and validated once, applying them is then plain calls
+        self._inner_pipeline = [
+            (
+                convertor.name,
+                compile_inner_convertor(convertor.name, convertor.params or {}),
+            )
+            for convertor in self.innerConvertor or []
+        ]
+        self._inner_pipeline_many = [
+            (
+                convertor.name,
+                compile_inner_convertor_many(convertor.name, convertor.params or {}),
+            )
+            for convertor in self.innerConvertor or []
+        ]
+        return self
+
+    @property
+    def inner_pipeline(self) -> List[Tuple[str, Callable[[str], str]]]:
+        """Inner convertors by name, each fed the result of the previous one."""
+        return self._inner_pipeline
+
+    @property
+    def inner_pipeline_many(self) -> List[Tuple[str, Callable[[List[str]], List[str]]]]:
+        """`inner_pipeline` converting many values in one call each."""
+        return self._inner_pipeline_many
+
 
 class TemplateMeta(BaseModel):
     parameters: List[Parameter] = Field(default_factory=list)
+
+    _graph: MetaGraph = PrivateAttr()
+
+    @model_validator(mode="after")
+    def validate_parameter_dependencies(self):
+        # Raises on undefined targets and circular dependencies
+        self._graph = MetaGraph(self.parameters)
+        return self
+
+    @property
+    def graph(self) -> MetaGraph:
+        return self._graph
+
+
+class BatchEntry(BaseModel):
+    params: Dict[str, Any] = Field(default_factory=dict)
+    template: Optional[str] = None
+    output: Optional[str] = None
+
+
+class BatchManifest(BaseModel):
+    template: Optional[str] = None
+    sets: List[BatchEntry] = Field(default_factory=list)
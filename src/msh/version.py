@@ -0,0 +1,12 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def package_version() -> str:
+    """Installed version of msh, `unknown` when running from a source tree."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("mustache-plus")
+    except PackageNotFoundError:
+        return "unknown"
@@ -0,0 +1,412 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from rich.console import Console
+
+from .types import Parameter, TemplateMeta
+from .load_meta import ask_parameter, resolve_metas, try_load_template_meta
+from .render import (
+    RenderError,
+    is_template_file,
+    render_output_file,
+    render_path,
+    render_template,
+    walk_files,
+)
+from .template_index import TemplateIndex, load_template_index
+from .partials import get_shared_partials_path, load_partials
+from .msh_constants import (
+    TEMPLATE_META_FILES,
+    TEMPLATE_PARTIALS_DIR,
+    WATCH_DEBOUNCE,
+    WATCH_POLL_INTERVAL,
+)
+
+
+console = Console()
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Changed paths under directory trees, from Linux inotify through libc.
+    New directories are watched as they appear; an event queue overflow
+    reports the first root itself, meaning anything may have changed.
+    """
+
+    def __init__(self, path: str, *more_paths: str):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.path = path
+        self.directories: Dict[int, str] = {}
+        for root in (path, *more_paths):
+            self.add_tree(root)
+
+    def add_tree(self, path: str) -> List[str]:
+        """Watch every directory under `path`, returning the files found."""
+        files = []
+        for root, _, filenames in os.walk(path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {root}")
+            self.directories[wd] = root
+            files.extend(os.path.join(root, filename) for filename in filenames)
+        return files
+
+    def changes(self, timeout: Optional[float]) -> Set[str]:
+        """Paths changed within `timeout` seconds, empty if none."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: Set[str] = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[
+                offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length
+            ]
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.path)
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name.rstrip(b"\0")))
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may have been created before the directory was watched
+                changed.update(self.add_tree(path))
+            changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Changed paths under directory trees, by comparing file mtimes and sizes."""
+
+    def __init__(
+        self, path: str, *more_paths: str, interval: float = WATCH_POLL_INTERVAL
+    ):
+        self.path = path
+        self.paths = (path, *more_paths)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for path in self.paths:
+            for root, _, filenames in os.walk(path):
+                for filename in filenames:
+                    file_path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self, timeout: Optional[float]) -> Set[str]:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self.scan()
+        changed = {
+            path
+            for path in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(path) != self.snapshot.get(path)
+        }
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(path: str, *more_paths: str, poll: bool = False):
+    """An inotify watcher where available, a polling one otherwise."""
+    if not poll:
+        try:
+            return InotifyWatcher(path, *more_paths)
+        except (OSError, AttributeError):
+            # Not Linux, no libc with inotify, or out of watches
+            pass
+    return PollingWatcher(path, *more_paths)
+
+
+def wait_for_changes(watcher, debounce: float = WATCH_DEBOUNCE) -> Set[str]:
+    """
+    Block until something changes, then keep collecting until nothing has
+    changed for `debounce` seconds, so a burst of saves is handled once.
+    """
+    changed: Set[str] = set()
+    while not changed:
+        changed = watcher.changes(None)
+    while True:
+        more = watcher.changes(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def recording_answer(
+    answers: Dict[str, Optional[str]],
+) -> Callable[[Parameter], Optional[str]]:
+    """Answer from the earlier answers, prompting only for new parameters."""
+
+    def answer(param: Parameter) -> Optional[str]:
+        if param.name not in answers:
+            answers[param.name] = ask_parameter(param)
+        return answers[param.name]
+
+    return answer
+
+
+class WatchSession:
+    """
+    A template rendered into a fixed output directory and kept up to date.
+
+    Parameters are asked once; when the meta file changes, the metas are
+    resolved again from the same answers and everything is rendered again.
+    A changed template file only renders its own output file, and a removed
+    one removes it; a changed partial, of the template or of the shared
+    partials directory, renders everything again. Metas are also resolved
+    again, without prompting, when a file starts referencing parameters that
+    were not computed.
+    """
+
+    def __init__(self, template_path: str, output_path: str, meta: TemplateMeta):
+        self.template_path = template_path
+        self.output_path = output_path
+        self.meta = meta
+        self.answers: Dict[str, Optional[str]] = {}
+        self.files: List[str] = walk_files(template_path)
+        self.index: TemplateIndex = load_template_index(
+            template_path, file_paths=self.files
+        )
+        self.metas: Dict[str, str] = {}
+        # Output file of every template file, to remove it when it goes away
+        self.outputs: Dict[str, str] = {}
+
+    def resolve(self):
+        self.metas = resolve_metas(
+            self.meta, recording_answer(self.answers), self.index.references()
+        )
+
+    def render_all(self):
+        output_file_paths = render_template(
+            self.template_path,
+            self.output_path,
+            self.metas,
+            files=dict.fromkeys(self.files),
+            index=self.index,
+        )
+        outputs = dict(zip(self.files, output_file_paths))
+        for file_path, output_file_path in self.outputs.items():
+            if outputs.get(file_path) != output_file_path:
+                self.remove_output(output_file_path, outputs.values())
+        self.outputs = outputs
+
+    def render_file(self, file_path: str):
+        output_file_path = render_path(file_path, self.metas).replace(
+            self.template_path, self.output_path
+        )
+        previous = self.outputs.get(file_path)
+        if previous is not None and previous != output_file_path:
+            self.remove_output(previous)
+        os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+        render_output_file(
+            file_path,
+            output_file_path,
+            self.metas,
+            has_tags=self.index.has_tags(self.template_path, file_path),
+            stream=self.index.can_stream(self.template_path, file_path),
+            partials=load_partials(self.template_path),
+        )
+        self.outputs[file_path] = output_file_path
+
+    def remove_output(self, output_file_path: str, keep=()):
+        if output_file_path in keep:
+            return
+        try:
+            os.remove(output_file_path)
+        except FileNotFoundError:
+            pass
+
+    def start(self):
+        self.resolve()
+        self.render_all()
+        console.print(
+            f"[green]√[/green] Rendered [green]{len(self.outputs)}[/green] files to: [magenta]{self.output_path}[/magenta]"
+        )
+
+    def apply(self, changed: Set[str]):
+        """Bring the output up to date with the changed paths."""
+        meta_files = {
+            os.path.join(self.template_path, meta_file)
+            for meta_file in TEMPLATE_META_FILES
+        }
+        files = walk_files(self.template_path)
+        references = self.index.references()
+        self.index = load_template_index(self.template_path, self.index, files)
+        removed = [file_path for file_path in self.files if file_path not in files]
+        self.files = files
+
+        if changed & meta_files or self.template_path in changed:
+            template_meta = try_load_template_meta(self.template_path)
+            if template_meta is None:
+                raise SystemExit()
+            self.meta = template_meta
+            self.resolve()
+            self.render_all()
+            console.print(
+                f"[green]√[/green] Template meta changed, rendered [green]{len(self.outputs)}[/green] files"
+            )
+            return
+
+        partials_paths = [
+            os.path.join(self.template_path, TEMPLATE_PARTIALS_DIR),
+            get_shared_partials_path(),
+        ]
+        if any(
+            path == partials_path or path.startswith(partials_path + os.sep)
+            for path in changed
+            for partials_path in partials_paths
+            if partials_path
+        ):
+            # Any file may include the partial
+            self.render_all()
+            console.print(
+                f"[green]√[/green] Partials changed, rendered [green]{len(self.outputs)}[/green] files"
+            )
+            return
+
+        new_references = self.index.references()
+        if references is not None and (
+            new_references is None or not new_references <= references
+        ):
+            self.resolve()
+
+        for file_path in removed:
+            output_file_path = self.outputs.pop(file_path, None)
+            if output_file_path is not None:
+                self.remove_output(output_file_path)
+                console.print(
+                    f"[yellow]-[/yellow] Removed [magenta]{output_file_path}[/magenta]"
+                )
+        changed_files = [
+            file_path
+            for file_path in files
+            if file_path in changed or file_path not in self.outputs
+        ]
+        errors = []
+        for file_path in changed_files:
+            try:
+                self.render_file(file_path)
+            except Exception as e:
+                errors.append((file_path, e))
+                continue
+            console.print(
+                f"[green]√[/green] Rendered [magenta]{self.outputs[file_path]}[/magenta]"
+            )
+        if errors:
+            raise RenderError(errors)
+
+
+def is_watched_change(template_path: str, path: str) -> bool:
+    """Ignore the variable index `load_template_index` writes into the template."""
+    return (
+        path == template_path
+        or is_template_file(os.path.basename(path))
+        or (os.path.basename(path) in TEMPLATE_META_FILES)
+    )
+
+
+def watch(template_path: str, output_path: str, poll: bool = False):
+    """Render a template, then render again what each edit affects until interrupted."""
+    template_meta = try_load_template_meta(template_path)
+    if template_meta is None:
+        console.print(
+            f"[red]Invalid template meta in: [cyan]{template_path}[/cyan][/red]"
+        )
+        raise SystemExit()
+    session = WatchSession(template_path, output_path, template_meta)
+    session.start()
+
+    # Templates may include the shared partials, when there are any
+    shared_partials_path = get_shared_partials_path()
+    more_paths = (
+        [shared_partials_path]
+        if shared_partials_path and os.path.isdir(shared_partials_path)
+        else []
+    )
+    watcher = create_watcher(template_path, *more_paths, poll=poll)
+    console.print(
+        f"[cyan]Watching [magenta]{template_path}[/magenta] "
+        f"({'polling' if isinstance(watcher, PollingWatcher) else 'inotify'}), press Ctrl+C to stop.[/cyan]"
+    )
+    try:
+        while True:
+            changed = {
+                path
+                for path in wait_for_changes(watcher)
+                if is_watched_change(template_path, path)
+            }
+            if not changed:
+                continue
+            try:
+                session.apply(changed)
+            except RenderError as e:
+                for file_path, error in e.errors:
+                    console.print(f"[red]  [cyan]{file_path}[/cyan]: {error}[/red]")
+            except SystemExit:
+                # Errors are reported, keep watching for the fix
+                console.print("[yellow]Waiting for the next change.[/yellow]")
+    except KeyboardInterrupt:
+        console.print("[red]Watch stopped.[/red]")
+    finally:
+        watcher.close()
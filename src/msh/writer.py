@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, List
+
+from .msh_constants import FSYNC_POLICIES
+
+# Read once, setting it is process wide and not thread safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Mode of a file created with open()
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def fsync_path(path: str):
+    """Flush a file, or a directory entry, to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Directories cannot be fsynced on every platform
+        pass
+    finally:
+        os.close(fd)
+
+
+class OutputWriter:
+    """
+    Stages a render into a temporary sibling of the output directory and
+    moves it into place once every file is written, so a failed or
+    interrupted render leaves the output directory untouched:
+
+        with OutputWriter(output_path, fsync="at-end") as writer:
+            writer.make_directories(...)
+            ... write to writer.staged(output_file_path) ...
+
+    A new output directory is moved into place with one atomic rename. Into
+    an existing one, files are moved one by one with `os.replace`, each
+    atomically, and files the render does not produce are kept.
+
+    `fsync` is `none`, `per-file` (the caller syncs each file as it writes
+    it) or `at-end` (every staged file is synced before the move).
+    """
+
+    def __init__(self, output_path: str, fsync: str = "none"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Unknown fsync policy: {fsync}, expected one of {', '.join(FSYNC_POLICIES)}"
+            )
+        self.output_path = os.path.normpath(output_path)
+        self._prefix = self.output_path + os.sep
+        self.fsync = fsync
+        self.staging_path = ""
+        self.files: List[str] = []
+
+    def __enter__(self) -> "OutputWriter":
+        parent = os.path.dirname(os.path.abspath(self.output_path))
+        Path(parent).mkdir(parents=True, exist_ok=True)
+        self.staging_path = tempfile.mkdtemp(
+            prefix=f".{os.path.basename(self.output_path)}.msh-", dir=parent
+        )
+        # mkdtemp creates it private, give it the mode of a plain mkdir
+        os.chmod(self.staging_path, 0o777 & ~_UMASK)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def staged(self, output_file_path: str) -> str:
+        """Where to write an output file until the render is committed."""
+        # Output paths are built by prefixing the output path, a plain slice
+        # is much cheaper than relpath over thousands of files
+        if output_file_path.startswith(self._prefix):
+            relative_path = output_file_path[len(self._prefix) :]
+        else:
+            relative_path = os.path.relpath(output_file_path, self.output_path)
+        self.files.append(relative_path)
+        return os.path.join(self.staging_path, relative_path)
+
+    def make_directories(self, directories: Iterable[str]):
+        """Create the staged output directories in one pass."""
+        for directory in sorted(set(directories)):
+            relative_path = os.path.relpath(directory, self.output_path)
+            Path(self.staging_path, relative_path).mkdir(parents=True, exist_ok=True)
+
+    def commit(self):
+        if self.fsync == "at-end":
+            for relative_path in self.files:
+                fsync_path(os.path.join(self.staging_path, relative_path))
+        try:
+            # Replaces a missing or empty output directory atomically
+            os.rename(self.staging_path, self.output_path)
+        except OSError:
+            self.merge()
+        if self.fsync != "none":
+            fsync_path(os.path.dirname(os.path.abspath(self.output_path)))
+
+    def merge(self):
+        """Move the staged files into an existing output directory."""
+        for directory in sorted(
+            {os.path.dirname(relative_path) for relative_path in self.files}
+        ):
+            Path(self.output_path, directory).mkdir(parents=True, exist_ok=True)
+        for relative_path in self.files:
+            os.replace(
+                os.path.join(self.staging_path, relative_path),
+                os.path.join(self.output_path, relative_path),
+            )
+        if self.fsync != "none":
+            for directory in {
+                os.path.dirname(relative_path) for relative_path in self.files
+            }:
+                fsync_path(os.path.join(self.output_path, directory))
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.staging_path, ignore_errors=True)
@@ -0,0 +1,41 @@
+import os
+
+from msh.render import render_template, render_to_memory
+
+BINARY = bytes(range(256)) * 4
+
+
+def make_template(template_path):
+    os.makedirs(os.path.join(template_path, "src"))
+    with open(os.path.join(template_path, "src", "{{name}}.txt"), "w") as file:
+        file.write("Hello {{name}}\n")
+    with open(os.path.join(template_path, "plain.txt"), "w") as file:
+        file.write("no tags here\n")
+    with open(os.path.join(template_path, "img.bin"), "wb") as file:
+        file.write(BINARY)
+
+
+def test_render_template_copies_binary_files_without_index(tmp_path):
+    template_path = str(tmp_path / "template")
+    output_path = str(tmp_path / "output")
+    make_template(template_path)
+
+    render_template(template_path, output_path, {"name": "world"})
+
+    with open(os.path.join(output_path, "img.bin"), "rb") as file:
+        assert file.read() == BINARY
+    with open(os.path.join(output_path, "src", "world.txt")) as file:
+        assert file.read() == "Hello world\n"
+    with open(os.path.join(output_path, "plain.txt")) as file:
+        assert file.read() == "no tags here\n"
+
+
+def test_render_to_memory_keeps_binary_files_without_index(tmp_path):
+    template_path = str(tmp_path / "template")
+    make_template(template_path)
+
+    files = render_to_memory(template_path, {"name": "world"})
+
+    assert files["img.bin"] == BINARY
+    assert files["src/world.txt"] == f"Hello world{os.linesep}".encode()
+    assert files["plain.txt"] == b"no tags here\n"